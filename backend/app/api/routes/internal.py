@@ -0,0 +1,69 @@
+import hmac
+from fastapi import APIRouter, Depends, HTTPException, Request, Header, Response
+from typing import Optional
+from app.core.config import settings
+from app.core.logging_config import logging_stats
+from app.core.metrics import render_metrics
+from app.db.pool_stats import pool_stats
+from app.db.write_behind import prediction_writer
+from app.lib.prediction_cache import prediction_cache
+from app.lib.dashboard_cache import dashboard_cache
+from app.auth.user_cache import user_snapshot_cache
+from app.auth.utils import password_hash_stats
+from app.db.plan_catalog import plan_catalog
+from app.lib.mail_transport import mail_transport
+from app.api.routes.paddle_webhook import paddle_event_worker
+from app.api.routes.predict import gpt_flight
+
+
+internal_router = APIRouter()
+# Mounted at the root so scrapers find the conventional /metrics path
+metrics_router = APIRouter()
+
+LOCAL_HOSTS = {"127.0.0.1", "::1", "localhost"}
+
+
+def require_internal_access(request: Request, x_internal_token: Optional[str] = Header(default=None)):
+    """
+    With INTERNAL_API_TOKEN set, callers must send it as X-Internal-Token.
+    Without it, only loopback clients are allowed.
+    """
+    if settings.INTERNAL_API_TOKEN:
+        if not x_internal_token or not hmac.compare_digest(x_internal_token, settings.INTERNAL_API_TOKEN):
+            raise HTTPException(status_code=403, detail="Forbidden")
+    elif not request.client or request.client.host not in LOCAL_HOSTS:
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+
+@metrics_router.get("/metrics", dependencies=[Depends(require_internal_access)])
+def metrics():
+    """Prometheus exposition format; merged across workers when PROMETHEUS_MULTIPROC_DIR is set."""
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+
+@internal_router.get("/stats", dependencies=[Depends(require_internal_access)])
+def internal_stats():
+    return {
+        "db_pool": pool_stats(),
+        "prediction_cache": prediction_cache.stats() if prediction_cache else None,
+        "gpt_singleflight": gpt_flight.stats(),
+        "write_behind": prediction_writer.stats(),
+        "dashboard_cache": dashboard_cache.stats(),
+        "auth_cache": user_snapshot_cache.stats(),
+        "password_hashing": password_hash_stats(),
+        "mail": mail_transport.stats(),
+        "paddle_events": paddle_event_worker.stats(),
+        "plan_catalog": plan_catalog.stats(),
+        "logging": logging_stats(),
+    }
+
+
+@internal_router.post("/plans/reload", dependencies=[Depends(require_internal_access)])
+async def reload_plans():
+    """
+    Re-read `plans` after editing them. Only this worker process is refreshed
+    now; the others pick the change up within PLAN_CATALOG_REFRESH_SECONDS.
+    """
+    count = await plan_catalog.reload()
+    return {"plans": count, "loaded_at": plan_catalog.loaded_at}
@@ -1,14 +1,22 @@
 from fastapi import APIRouter, Form, File, UploadFile, Depends, HTTPException, Request, Header
+from sqlalchemy import update, func
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel, Field
 from typing import List,Optional
 from fastapi.responses import JSONResponse
 from fastapi import HTTPException
 from dotenv import load_dotenv
-from app.db.database import get_db
+from app.db.database import get_db, get_async_db
 from app.db.models import User, Subscription, Plan
 from datetime import datetime, timezone
 from app.schemas.meeting_schemas import *
+from app.lib.dashboard_cache import invalidate_dashboard
+from app.auth.user_cache import invalidate_user_snapshot
+from app.db.plan_catalog import plan_catalog
+from app.db.paddle_events import PaddleEventWorker, record_paddle_event, parse_paddle_timestamp
+from app.core.config import settings
 from starlette.requests import ClientDisconnect
 from starlette.responses import JSONResponse
 import os
@@ -16,9 +24,10 @@ import httpx
 import hmac
 import hashlib
 import json
+import logging
 
 
-
+logger = logging.getLogger(__name__)
 
 paddle_router = APIRouter()
 PADDLE_API_KEY = os.getenv("PADDLE_API_KEY")  # Set this securely
@@ -43,120 +52,136 @@ if not PADDLE_WEBHOOK_SECRET:
     raise ValueError("PADDLE_WEBHOOK_SECRET environment variable must be set for webhook signature verification.")
 
 
+def extract_subscription_details(sub_event_data: dict, user_id: str = None) -> dict:
+    """
+    Column values for a `subscriptions` row from a subscription.* event's
+    `data`. Timestamps are parsed here, once, and the amount is in currency
+    units (Paddle sends minor units as a string).
+    """
+    items = sub_event_data.get("items", [])
+    first_item = items[0] if items else {}
+    price_data = first_item.get("price", {})
+
+    unit_price_amount = None
+    if price_data.get('unit_price'):
+        unit_price_amount = float(price_data['unit_price'].get('amount', '0')) / 100
+    elif first_item.get('unit_price'):
+        unit_price_amount = float(first_item['unit_price'].get('amount', '0')) / 100
+
+    billing_period = sub_event_data.get("current_billing_period") or {}
+    return {
+        "paddle_subscription_id": sub_event_data.get("id"),
+        "paddle_price_id": price_data.get("id"),
+        "user_id": user_id, # Link to your internal user ID
+        "status": sub_event_data.get("status"),
+        "current_period_start": parse_paddle_timestamp(billing_period.get("starts_at")),
+        "current_period_end": parse_paddle_timestamp(billing_period.get("ends_at")),
+        "next_billed_at": parse_paddle_timestamp(sub_event_data.get("next_billed_at")),
+        "cancel_at_period_end": bool(sub_event_data.get("cancel_at_period_end")),
+        "unit_price_amount": unit_price_amount,
+        "quantity": first_item.get("quantity"),
+    }
+
+
+def match_plan(paddle_price_id: str = None, unit_price_amount: float = None):
+    """Plan for a Paddle price: by price id first, then by exact-cent amount."""
+    plan = plan_catalog.by_paddle_price_id(paddle_price_id)
+    if plan is None and unit_price_amount is not None:
+        plan = plan_catalog.by_price(unit_price_amount)
+    return plan
+
+
 # --- Helper for DB operations using SQLAlchemy Session ---
-async def db_upsert_subscription(db: Session, sub_data: dict):
+def subscription_upsert_rows(rows: list) -> list:
+    """Parameter rows for SUBSCRIPTION_UPSERT from extract_subscription_details() rows."""
+    now = datetime.now(timezone.utc)
+    values = []
+    for row in rows:
+        plan = match_plan(row["paddle_price_id"], row["unit_price_amount"])
+        values.append({**row, "plan_id": plan.id if plan else None, "created_at": now, "updated_at": now})
+    return values
+
+
+def _subscription_upsert():
+    stmt = insert(Subscription)
+    excluded = stmt.excluded
+    return stmt.on_conflict_do_update(
+        index_elements=[Subscription.paddle_subscription_id],
+        set_={
+            "user_id": func.coalesce(excluded.user_id, Subscription.user_id),
+            "plan_id": func.coalesce(excluded.plan_id, Subscription.plan_id),
+            "paddle_price_id": excluded.paddle_price_id,
+            "status": excluded.status,
+            "current_period_start": excluded.current_period_start,
+            "current_period_end": excluded.current_period_end,
+            "next_billed_at": excluded.next_billed_at,
+            "cancel_at_period_end": excluded.cancel_at_period_end,
+            "unit_price_amount": excluded.unit_price_amount,
+            "quantity": excluded.quantity,
+            "updated_at": excluded.updated_at,
+        },
+    )
+
+
+# INSERT ... ON CONFLICT (paddle_subscription_id) DO UPDATE, executed with
+# subscription_upsert_rows(). Built once so it compiles once; many rows go
+# out as one executemany. A missing user_id or plan keeps the stored one.
+SUBSCRIPTION_UPSERT = _subscription_upsert()
+
+
+def user_subscription_values(
+    plan_status: str,
+    paddle_current_subscription_id: str = None,
+    unit_price_amount: float = None,
+    paddle_price_id: str = None
+) -> dict:
     """
-    Inserts or updates a subscription record in the 'subscriptions' table.
+    `users` columns to set for a subscription change. plan_id is only
+    included when the price maps to a known plan.
     """
-    print(f"Attempting DB UPSERT for Subscription: {sub_data.get('paddle_subscription_id')}")
-    try:
-        # Check if subscription already exists
-        existing_sub = db.query(Subscription).filter(
-            Subscription.paddle_subscription_id == sub_data['paddle_subscription_id']
-        ).first()
-
-        if existing_sub:
-            # Update existing subscription
-            for key, value in sub_data.items():
-                if hasattr(existing_sub, key):
-                    # Handle datetime conversion for timestamp fields
-                    if key in ['current_period_start', 'current_period_end', 'next_billed_at'] and value:
-                        setattr(existing_sub, key, datetime.fromisoformat(value.replace('Z', '+00:00')))
-                    elif key == 'unit_price_amount' and value is not None:
-                        setattr(existing_sub, key, float(value)) # Ensure numeric conversion
-                    else:
-                        setattr(existing_sub, key, value)
-            existing_sub.updated_at = datetime.now(timezone.utc)
-            db.add(existing_sub) # Mark for update
-            print(f"✅ Updated existing subscription {sub_data['paddle_subscription_id']}")
-            db.commit()
-            db.refresh(existing_sub)
-            return existing_sub
+    values = {
+        "plan_status": plan_status,
+        "paddle_current_subscription_id": paddle_current_subscription_id,
+    }
+    if paddle_price_id is not None or unit_price_amount is not None:
+        matched_plan = match_plan(paddle_price_id, unit_price_amount)
+        if matched_plan:
+            values["plan_id"] = matched_plan.id
         else:
-            # Create new subscription
-            new_sub = Subscription(
-                paddle_subscription_id=sub_data['paddle_subscription_id'],
-                user_id=sub_data['user_id'],
-                paddle_price_id=sub_data['paddle_price_id'],
-                status=sub_data['status'],
-                cancel_at_period_end=sub_data.get('cancel_at_period_end', False),
-                unit_price_amount=float(sub_data['unit_price_amount']) if sub_data.get('unit_price_amount') is not None else None,
-                quantity=sub_data.get('quantity', 1),
-                created_at=datetime.now(timezone.utc) # Set created_at only for new records
-            )
-            if sub_data.get('current_period_start'):
-                new_sub.current_period_start = datetime.fromisoformat(sub_data['current_period_start'].replace('Z', '+00:00'))
-            if sub_data.get('current_period_end'):
-                new_sub.current_period_end = datetime.fromisoformat(sub_data['current_period_end'].replace('Z', '+00:00'))
-            if sub_data.get('next_billed_at'):
-                new_sub.next_billed_at = datetime.fromisoformat(sub_data['next_billed_at'].replace('Z', '+00:00'))
-
-            db.add(new_sub)
-            print(f"✅ Created new subscription {sub_data['paddle_subscription_id']}")
-            db.commit()
-            db.refresh(new_sub)
-            return new_sub
-    except Exception as e:
-        db.rollback() # Rollback in case of error
-        print(f"🚨 Error during SQLAlchemy subscription upsert: {e}")
-        raise HTTPException(status_code=500, detail=f"Internal server error during subscription upsert: {e}")
-
-async def db_update_user_subscription_info(
-    db: Session, 
-    user_id: str,
-    plan_status: str, 
-    unit_price_amount: float = None ,
-    paddle_current_subscription_id: str = None
-):
+            logger.warning("No plan found for price %s / $%s. Skipping plan_id update.", paddle_price_id, unit_price_amount)
+    return values
+
+
+async def db_apply_subscription_event(db: AsyncSession, sub_details: dict, user_values: Optional[dict] = None):
     """
-    Updates user-specific subscription information in the 'users' table.
+    One transaction per subscription event: the subscription upsert, plus a
+    single users UPDATE when user_values is given, and one commit.
     """
-    print(f"Attempting DB UPDATE for User {user_id} with plan_status: {plan_status}")
+    user_id = sub_details.get("user_id")
     try:
-        user = db.query(User).filter(User.id == user_id).first()
-        if not user:
-            print(f"❌ User with ID {user_id} not found for update.")
-            # Depending on your app, you might raise an error or create a user here
-            return None
-
-        user.plan_status = plan_status
-        
-        # Only update paddle_current_subscription_id if explicitly provided (including None)
-        if paddle_current_subscription_id is not None:
-            user.paddle_current_subscription_id = paddle_current_subscription_id
-        elif paddle_current_subscription_id is None: # Explicitly set to None if passed as None
-            user.paddle_current_subscription_id = None
-        # If paddle_current_subscription_id is not passed at all, leave it as is.
-        # 🔥 Match and update plan_id from plans table based on unit_price_amount
-        if unit_price_amount is not None:
-            matched_plan = db.query(Plan).filter(Plan.price_usd == unit_price_amount).first()
-            if matched_plan:
-                user.plan_id = matched_plan.id
-                print(f"✅ Set plan_id for user {user_id} to Plan {matched_plan.name} (${unit_price_amount})")
-            else:
-                print(f"⚠️ No plan found for price ${unit_price_amount}. Skipping plan_id update.")
-
-        db.add(user) # Mark for update
-        db.commit()
-        db.refresh(user)
-        print(f"✅ Successfully updated user {user_id} subscription info.")
-        return user
+        await db.execute(SUBSCRIPTION_UPSERT, subscription_upsert_rows([sub_details]))
+        if user_id and user_values is not None:
+            await db.execute(update(User).where(User.id == user_id).values(**user_values))
+        await db.commit()
     except Exception as e:
-        db.rollback() # Rollback in case of error
-        print(f"🚨 Error during SQLAlchemy user update: {e}")
-        raise HTTPException(status_code=500, detail=f"Internal server error during user update: {e}")
+        await db.rollback() # Rollback in case of error
+        logger.error("Error applying subscription %s: %s", sub_details.get("paddle_subscription_id"), e)
+        raise
+
+    if user_id and user_values is not None:
+        invalidate_dashboard(user_id)
+        invalidate_user_snapshot(user_id)
+    logger.info("Applied subscription %s (%s)", sub_details["paddle_subscription_id"], sub_details["status"])
 
 
 # --- Webhook Endpoint ---
 @paddle_router.post("/paddle")
-async def paddle_webhook(request: Request, db: Session = Depends(get_db)):
-    print("Webhook is up and running")
-
+async def paddle_webhook(request: Request, db: AsyncSession = Depends(get_async_db)):
     try:
         body = await request.body()
 
         if not body:
-            print("⚠️ Empty request body received.")
+            logger.warning("Empty Paddle webhook body received")
             return JSONResponse(
                 {"status": "ignored", "reason": "empty body"}, status_code=400
             )
@@ -164,140 +189,108 @@ async def paddle_webhook(request: Request, db: Session = Depends(get_db)):
         data = json.loads(body)
 
     except ClientDisconnect:
-        print("🚨 Client disconnected before sending body.")
+        logger.warning("Client disconnected before sending the webhook body")
         return JSONResponse(
             {"status": "error", "reason": "client disconnected"}, status_code=400
         )
 
     except json.JSONDecodeError as e:
-        print(f"🚨 JSON decode error: {e}")
+        logger.warning("Paddle webhook JSON decode error: %s", e)
         return JSONResponse(
             {"status": "error", "reason": "invalid JSON"}, status_code=400
         )
 
     except Exception as e:
-        print(f"🚨 Unexpected error reading webhook: {e}")
+        logger.exception("Unexpected error reading Paddle webhook")
         return JSONResponse(
             {"status": "error", "reason": str(e)}, status_code=500
         )
 
+    # Store the event once and acknowledge; paddle_event_worker applies it
+    is_new = await record_paddle_event(db, data, body)
+    if is_new:
+        paddle_event_worker.notify()
+    else:
+        paddle_event_worker.duplicates += 1
+    return JSONResponse({"status": "acknowledged", "event_type": data.get("event_type"), "duplicate": not is_new})
+
+
+# subscription.* events we apply, with their log label
+SUBSCRIPTION_EVENTS = {
+    "subscription.created": "Created",
+    "subscription.activated": "Activated",
+    "subscription.updated": "Updated",
+    "subscription.past_due": "Past Due",
+    "subscription.paused": "Paused",
+    "subscription.resumed": "Resumed",
+    "subscription.canceled": "Canceled",
+    "subscription.expired": "Expired",
+}
+
+
+def subscription_user_values(event_type: str, sub_details: dict) -> Optional[dict]:
+    """
+    What a subscription event does to its user: None leaves the user as is.
+    Shared by the webhook worker and the offline backfill.
+    """
+    if event_type == "subscription.canceled" and sub_details.get('cancel_at_period_end'):
+        logger.debug("Subscription %s will cancel at period end; user keeps the current plan until then",
+                     sub_details["paddle_subscription_id"])
+        return None
+    if event_type in ("subscription.canceled", "subscription.expired"):
+        # Immediate cancellation or expiry: downgrade to 'free' and clear current subscription ID
+        return user_subscription_values('free', paddle_current_subscription_id=None)
+    return user_subscription_values(
+        sub_details['status'],
+        paddle_current_subscription_id=sub_details['paddle_subscription_id'],
+        unit_price_amount=sub_details['unit_price_amount'],
+        paddle_price_id=sub_details['paddle_price_id'],
+    )
+
+
+async def handle_paddle_event(db: AsyncSession, data: dict):
+    """
+    Applies one stored Paddle event. Runs on the background worker, never in
+    the request; raising makes the worker retry the event later.
+    """
     event_type = data.get("event_type")
     event_data = data.get("data", {})
     custom_data = event_data.get("custom_data", {})
     user_id = custom_data.get("user_id") # This is your internal user ID from checkout
 
-    print(f"Received Paddle Webhook Event: {event_type}")
-    if user_id:
-        print(f"  Associated User ID from custom_data: {user_id}")
-    else:
-        print("  No user_id found in custom_data for this event. This may be expected for some events (e.g., customer.created if not from checkout).")
-
-    # Helper function to extract subscription details
-    def extract_subscription_details(sub_event_data):
-        items = sub_event_data.get("items", [])
-        first_item = items[0] if items else {}
-        price_data = first_item.get("price", {})
-        
-        unit_price_amount = None
-        if price_data.get('unit_price'):
-            unit_price_amount = float(price_data['unit_price'].get('amount', '0')) / 100 
-        elif first_item.get('unit_price'):
-             unit_price_amount = float(first_item['unit_price'].get('amount', '0')) / 100
-
-        return {
-            "paddle_subscription_id": sub_event_data.get("id"),
-            "paddle_price_id": price_data.get("id"),
-            "user_id": user_id, # Link to your internal user ID
-            "status": sub_event_data.get("status"),
-            "current_period_start": sub_event_data.get("current_billing_period", {}).get("starts_at"),
-            "current_period_end": sub_event_data.get("current_billing_period", {}).get("ends_at"),
-            "next_billed_at": sub_event_data.get("next_billed_at"),
-            "cancel_at_period_end": sub_event_data.get("cancel_at_period_end"),
-            "unit_price_amount": unit_price_amount,
-            "quantity": first_item.get("quantity"),
-        }
+    # Expected to be missing for some events (e.g. customer.created outside checkout)
+    logger.debug("Handling Paddle event %s (user_id=%s)", event_type, user_id)
 
     # --- Handle different event types ---
 
-    if event_type == "subscription.created":
-        sub_details = extract_subscription_details(event_data)
-        print(f"Subscription Created: {sub_details}")
-        await db_upsert_subscription(db, sub_details)
-        if user_id:
-            await db_update_user_subscription_info(db, user_id, sub_details['status'], unit_price_amount=sub_details['unit_price_amount'],paddle_current_subscription_id=sub_details['paddle_subscription_id'])
-
-    elif event_type == "subscription.activated":
-        sub_details = extract_subscription_details(event_data)
-        print(f"Subscription Activated: {sub_details}")
-        await db_upsert_subscription(db, sub_details)
-        if user_id:
-            await db_update_user_subscription_info(db, user_id, sub_details['status'], unit_price_amount=sub_details['unit_price_amount'],paddle_current_subscription_id=sub_details['paddle_subscription_id'])
-
-    elif event_type == "subscription.updated":
-        sub_details = extract_subscription_details(event_data)
-        print(f"Subscription Updated: {sub_details}")
-        await db_upsert_subscription(db, sub_details)
-        if user_id:
-            await db_update_user_subscription_info(db, user_id, sub_details['status'], unit_price_amount=sub_details['unit_price_amount'],paddle_current_subscription_id=sub_details['paddle_subscription_id'])
-
-    elif event_type == "subscription.canceled":
-        sub_details = extract_subscription_details(event_data)
-        print(f"Subscription Canceled: {sub_details}")
-        await db_upsert_subscription(db, sub_details)
-        if user_id:
-            if sub_details.get('cancel_at_period_end'):
-                print(f"Subscription {sub_details['paddle_subscription_id']} will cancel at period end. User remains on current plan until then.")
-                # Optional: You might update user plan to 'canceling' or similar temporary status
-                # await db_update_user_subscription_info(db, user_id, 'canceling', paddle_current_subscription_id=sub_details['paddle_subscription_id'])
-            else:
-                # Immediate cancellation: set user plan to 'free' and clear current subscription ID
-                await db_update_user_subscription_info(db, user_id, 'free', unit_price_amount=None,paddle_current_subscription_id=None)
-
-    elif event_type == "subscription.past_due":
-        sub_details = extract_subscription_details(event_data)
-        print(f"Subscription Past Due: {sub_details}")
-        await db_upsert_subscription(db, sub_details)
-        if user_id:
-            await db_update_user_subscription_info(db, user_id, sub_details['status'],unit_price_amount=sub_details['unit_price_amount'],paddle_current_subscription_id=sub_details['paddle_subscription_id'])
-
-    elif event_type == "subscription.paused":
-        sub_details = extract_subscription_details(event_data)
-        print(f"Subscription Paused: {sub_details}")
-        await db_upsert_subscription(db, sub_details)
-        if user_id:
-            await db_update_user_subscription_info(db, user_id, sub_details['status'], unit_price_amount=sub_details['unit_price_amount'],paddle_current_subscription_id=sub_details['paddle_subscription_id'])
-
-    elif event_type == "subscription.resumed":
-        sub_details = extract_subscription_details(event_data)
-        print(f"Subscription Resumed: {sub_details}")
-        await db_upsert_subscription(db, sub_details)
-        if user_id:
-            await db_update_user_subscription_info(db, user_id, sub_details['status'], unit_price_amount=sub_details['unit_price_amount'],paddle_current_subscription_id=sub_details['paddle_subscription_id'])
-
-    elif event_type == "subscription.expired":
-        sub_details = extract_subscription_details(event_data)
-        print(f"Subscription Expired: {sub_details}")
-        await db_upsert_subscription(db, sub_details)
-        if user_id:
-            # Downgrade user to 'free' plan and clear current subscription ID.
-            await db_update_user_subscription_info(db, user_id, 'free', paddle_current_subscription_id=None)
+    if event_type in SUBSCRIPTION_EVENTS:
+        sub_details = extract_subscription_details(event_data, user_id)
+        logger.info("Subscription %s: %s (%s)", SUBSCRIPTION_EVENTS[event_type],
+                    sub_details["paddle_subscription_id"], sub_details["status"])
+        logger.debug("Subscription details: %s", sub_details)
+        user_values = subscription_user_values(event_type, sub_details) if user_id else None
+        await db_apply_subscription_event(db, sub_details, user_values)
 
     elif event_type == "transaction.completed":
         transaction_id = event_data.get("id")
         transaction_status = event_data.get("status")
         subscription_id = event_data.get("subscription_id")
-        customer_email = event_data.get("customer", {}).get("email")
         total_amount = event_data.get("details", {}).get("charge_totals", {}).get("total")
-        
-        print(f"Transaction Completed: ID={transaction_id}, Status={transaction_status}, Subscription ID={subscription_id}, Amount={total_amount}, Customer Email={customer_email}")
-        
-        if subscription_id:
-            print(f"Payment confirmed for subscription: {subscription_id}")
-        else:
-            print("This is a one-time transaction, not linked to a subscription. Handle fulfillment here if applicable.")
+
+        logger.info("Transaction completed: id=%s status=%s subscription=%s amount=%s",
+                    transaction_id, transaction_status, subscription_id, total_amount)
+        if not subscription_id:
+            # One-time transaction, not linked to a subscription. Handle fulfillment here if applicable.
+            logger.debug("Transaction %s is not linked to a subscription", transaction_id)
 
     else:
-        print(f"Unhandled event type: {event_type}")
+        logger.info("Unhandled Paddle event type: %s", event_type)
+
 
-    return JSONResponse({"status": "acknowledged", "event_type": event_type})
+paddle_event_worker = PaddleEventWorker(
+    handler=handle_paddle_event,
+    batch_size=settings.PADDLE_EVENT_BATCH_SIZE,
+    poll_interval=settings.PADDLE_EVENT_POLL_INTERVAL,
+    max_attempts=settings.PADDLE_EVENT_MAX_ATTEMPTS,
+)
 
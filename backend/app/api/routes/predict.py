@@ -1,62 +1,36 @@
-from fastapi import APIRouter, Form, File, UploadFile, Depends, HTTPException
+from fastapi import APIRouter, Form, File, UploadFile, Depends, HTTPException, Query
+from sqlalchemy import select
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel, Field
 from typing import List,Optional
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi import HTTPException
 from dotenv import load_dotenv
-from app.db.database import get_db
+from app.db.database import get_db, get_async_db
+from app.db.write_behind import prediction_writer, validate_prediction_row
+from app.db.recent_predictions import get_recent_predictions
+from app.db.dashboard import fetch_dashboard
+from app.db.plan_catalog import plan_catalog, PlanInfo
+from app.db.quota import reserve_predictions, refund_predictions, refund_predictions_detached
 from app.db.models import *
 from app.schemas.meeting_schemas import *
 from app.db.models import User, Plan
-from app.auth.jwt import get_current_user
+from app.auth.jwt import get_current_user_snapshot
+from app.auth.user_cache import UserSnapshot
+from app.core.config import settings
+from app.lib.openai_client import get_gpt_response, stream_gpt_response
+from app.lib.json_stream import StreamingFieldScanner
+from app.lib.prediction_cache import prediction_cache, make_prediction_cache_key
+from app.lib.dashboard_cache import dashboard_cache
+from app.lib.singleflight import SingleFlight, prompt_key
+from app.lib.prompt_budget import fit_sections, plan_token_budget
+from app.ml.inference import get_inference_engine
 import json
 import asyncio
 import os
-import httpx
-
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-OPENAI_API_URL = "https://api.openai.com/v1/chat/completions"
-
-async def get_gpt_response(model: str, prompt: str) -> str:
-    headers = {
-        "Authorization": f"Bearer {OPENAI_API_KEY}",
-        "Content-Type": "application/json"
-    }
-
-    payload = {
-        "model": model,
-        "messages": [
-            {"role": "system", "content": "You are an AI that returns ONLY valid JSON."},
-            {"role": "user", "content": prompt}
-        ],
-    
-    }
-
-    async with httpx.AsyncClient(timeout=60.0) as client:
-        response = await client.post(OPENAI_API_URL, headers=headers, json=payload)
-        if response.status_code != 200:
-            print("OpenAI API error:", response.text)
-            response.raise_for_status()
-        data = response.json()
-        return data["choices"][0]["message"]["content"].strip()
-    
-class MeetingInput(BaseModel):
-    time_block: str
-    meeting_title: str
-    meeting_notes: str
-    remote: bool
-    tool: str
-    agenda_file: Optional[str] = None
-    meeting_type: str
-    duration: int
-    attendees: int
-    agenda_clarity: int
-    has_action_items: bool
-    departments: int
-    roles: str
-    average_annual_salary: float
-
+import uuid
+from datetime import datetime
 
 
 class PredictionOutput(BaseModel):
@@ -77,74 +51,59 @@ router = APIRouter()
 
 @router.get("/meeting_statistics/{user_id}", response_model=DashboardResponse)
 def get_dashboard_data(user_id: str, db: Session = Depends(get_db)):
-    # Fetch meeting overview
-    overview = db.query(MeetingOverview).filter(MeetingOverview.user_id == user_id).first()
-    if not overview:
-        overview_data = MeetingOverviewOut(
-            user_id=user_id,
-            total_estimated_cost=0.0,
-            total_meeting_analyzed=0,
-            total_roi=0.0,
-            total_estimated_value_gain=0.0,
-            total_productive_meetings=0
-        )
-    else:
-        overview_data = MeetingOverviewOut.model_validate(overview)
-
-    # Fetch recent predictions
-    predictions = db.query(RecentPrediction).all()
-    predictions_data = [RecentPredictionOut.model_validate(pred) for pred in predictions]
-
-    # Fetch user + plan usage
-    user = db.query(User).filter(User.id == user_id).first()
-    if user and user.plan_id:
-        plan = db.query(Plan).filter(Plan.id == user.plan_id).first()
-        predictions_used = user.predictions_used
-        max_predictions_permonth = plan.max_predictions_per_month
-    else:
-        predictions_used = 0
-        max_predictions_permonth = 0
-
-    user_usage = UserUsage(
-        predictions_used=predictions_used,
-        max_predictions_per_month=max_predictions_permonth
+    cached = dashboard_cache.get(user_id)
+    if cached is not None:
+        return cached
+
+    # Overview, recent predictions and plan usage in one round trip
+    dashboard = fetch_dashboard(db, user_id)
+    dashboard_cache.set(user_id, dashboard)
+    return dashboard
+
+
+
+@router.get("/recent_predictions/{user_id}", response_model=RecentPredictionPage)
+def get_recent_predictions_page(user_id: str,
+                                limit: int = Query(default=10, ge=1, le=100),
+                                before: Optional[str] = None,
+                                db: Session = Depends(get_db),
+                                current_user: UserSnapshot = Depends(get_current_user_snapshot)):
+    """
+    Keyset-paginated prediction history of the signed-in user. Pass the
+    returned `next_before` as `before` to fetch the next (older) page.
+    """
+    if user_id != str(current_user.id):
+        raise HTTPException(status_code=403, detail="Forbidden")
+    predictions, next_before = get_recent_predictions(db, user_id, limit=limit, before=before)
+    return RecentPredictionPage(
+        items=[RecentPredictionOut.model_validate(pred) for pred in predictions],
+        next_before=next_before
     )
 
-    return DashboardResponse(
-        overview=overview_data,
-        recent_predictions=predictions_data,
-        user_usage=user_usage
-    )
 
+PREDICTION_BACKENDS = ("gpt", "local")
 
 
-@router.post("/predict_one")
-async def predict_one(meeting_data: MeetingInput, 
-                      db: Session = Depends(get_db), 
-                      current_user: User = Depends(get_current_user)):
-
-    # 1️⃣ Get user's plan
-    plan = db.query(Plan).filter(Plan.id == current_user.plan_id).first()
-    if not plan:
-        raise HTTPException(status_code=400, detail="User plan not found")
-
-    # 2️⃣ Select GPT model
-    if plan.name.lower() in ["pro", "business"]:
-        gpt_model = "gpt-5-mini"
-    else:
-        gpt_model = "gpt-5-nano"
+def select_prediction_backend(plan_name: str, requested: Optional[str]) -> str:
+    """
+    Free plans follow FREE_PLAN_PREDICTION_BACKEND; anyone may opt into the
+    local model, but only paid plans may ask for GPT when free is forced local.
+    """
+    if requested and requested not in PREDICTION_BACKENDS:
+        raise HTTPException(status_code=400, detail=f"Unknown prediction backend: {requested}")
+    is_paid = plan_name.lower() in ["pro", "business"]
+    if not is_paid and settings.FREE_PLAN_PREDICTION_BACKEND == "local":
+        return "local"
+    return requested or "gpt"
 
-    # 3️⃣ Check predictions quota
-    if current_user.predictions_used >= plan.max_predictions_per_month:
-        raise HTTPException(status_code=403, detail="Prediction quota exceeded")
 
-    # 4️⃣ Build GPT prompt with JSON enforcement
-    base_prompt = f"""
+def render_prediction_prompt(meeting_data: MeetingInput, notes: str, agenda: Optional[str]) -> str:
+    prompt = f"""
 You are a meeting ROI analysis assistant.
 
 Meeting details:
 - Title: {meeting_data.meeting_title}
-- Notes: {meeting_data.meeting_notes}
+- Notes: {notes}
 - Time Block: {meeting_data.time_block}
 - Remote: {meeting_data.remote}
 - Tool: {meeting_data.tool}
@@ -173,63 +132,137 @@ Return ONLY valid JSON with these exact keys:
 }}
 """
 
-    if meeting_data.agenda_file:
-        base_prompt += f"\nAgenda File Content:\n{meeting_data.agenda_file}"
+    if agenda:
+        prompt += f"\nAgenda File Content:\n{agenda}"
+    return prompt
+
+
+def build_prediction_prompt(meeting_data: MeetingInput, token_budget: Optional[int] = None,
+                            gpt_model: str = "gpt-5-nano") -> str:
+    """
+    Builds the GPT prompt with JSON enforcement for a single meeting. With a
+    token_budget, oversized notes and agenda text are condensed to fit it.
+    """
+    notes, agenda = meeting_data.meeting_notes, meeting_data.agenda_file
+    if token_budget:
+        notes, agenda = fit_sections(
+            render_prediction_prompt(meeting_data, "", None), [notes, agenda], token_budget, gpt_model
+        )
+    return render_prediction_prompt(meeting_data, notes, agenda)
+
+
+# Identical predictions requested at the same time (a shared meeting link)
+# wait on one upstream completion instead of each paying for their own
+gpt_flight = SingleFlight()
+
 
-    # 5️⃣ Call GPT API
+async def fetch_gpt_prediction(gpt_model: str, prompt: str, cache_key: str) -> dict:
     try:
-        gpt_response = await get_gpt_response(model=gpt_model, prompt=base_prompt)
+        gpt_response = await get_gpt_response(model=gpt_model, prompt=prompt)
         prediction_data = json.loads(gpt_response)
     except json.JSONDecodeError:
         raise HTTPException(status_code=500, detail="Invalid GPT output format")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"GPT request failed: {str(e)}")
 
-    # 6️⃣ Store meeting + prediction asynchronously
-    async def store_meeting_and_prediction():
-        # Meeting record
-        meeting = Meeting(
-            user_id=current_user.id,
-            meeting_title=meeting_data.meeting_title,
-            agenda_format=None,
-            agenda_file=meeting_data.agenda_file,
-            time_block=meeting_data.time_block,
-            remote=meeting_data.remote,
-            tool=meeting_data.tool,
-            meeting_type=meeting_data.meeting_type,
-            duration=meeting_data.duration,
-            attendees=meeting_data.attendees,
-            agenda_clarity=[meeting_data.agenda_clarity],
-            has_action_items=meeting_data.has_action_items,
-            departments=str(meeting_data.departments),
-            roles=meeting_data.roles,
-            average_annual_salary=meeting_data.average_annual_salary,
-            meeting_notes=meeting_data.meeting_notes,
-            roi=prediction_data["roi"]
-        )
-        db.add(meeting)
-        db.flush()  # so we get meeting_id before commit
-
-        # Prediction record
-        prediction = MeetingPrediction(
-            meeting_id=meeting.meeting_id,
-            is_productive=prediction_data["is_productive"],
-            confidence_score=prediction_data["confidence_score"],
-            roi=prediction_data["roi"],
-            estimated_cost=prediction_data["estimated_cost"],
-            estimated_value_gain_on_meeting=prediction_data["estimated_value_gain_on_meeting"],
-            suggestions=json.dumps(prediction_data["suggestions"])
-        )
-        db.add(prediction)
+    # Cached here, inside the shared call, so the result is kept even if every waiter went away
+    if prediction_cache:
+        await prediction_cache.set(cache_key, prediction_data)
+    return prediction_data
+
+
+async def predict_with_gpt(meeting_data: MeetingInput, gpt_model: str, token_budget: Optional[int] = None) -> dict:
+    """
+    Returns the parsed GPT prediction, serving recurring meetings from the cache
+    and sharing one upstream call between concurrent identical requests.
+    """
+    cache_key = make_prediction_cache_key(meeting_data, gpt_model, token_budget)
+    if prediction_cache:
+        cached = await prediction_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+    prompt = build_prediction_prompt(meeting_data, token_budget, gpt_model)
+    return await gpt_flight.do(
+        prompt_key(gpt_model, prompt),
+        lambda: fetch_gpt_prediction(gpt_model, prompt, cache_key),
+    )
+
+
+async def require_plan(current_user: UserSnapshot) -> PlanInfo:
+    plan = await plan_catalog.get_by_id(current_user.plan_id) if current_user.plan_id is not None else None
+    if plan is None:
+        raise HTTPException(status_code=400, detail="User plan not found")
+    return plan
+
+
+async def get_predictions_used(db: AsyncSession, user_id) -> int:
+    return await db.scalar(select(User.predictions_used).where(User.id == user_id)) or 0
+
+
+PREDICTION_MODELS = ("gpt-5-nano", "gpt-5-mini")
+
+
+def select_gpt_model(plan_name: str) -> str:
+    if plan_name.lower() in ["pro", "business"]:
+        return "gpt-5-mini"
+    return "gpt-5-nano"
+
+
+def build_meeting_row(user_id, meeting_data: MeetingInput, prediction_data: dict) -> dict:
+    """
+    Column values for a `meetings` row. meeting_id is generated up front so
+    predictions can reference it without a flush round trip.
+    """
+    return {
+        "meeting_id": uuid.uuid4(),
+        "user_id": user_id,
+        "meeting_title": meeting_data.meeting_title,
+        "agenda_format": None,
+        "agenda_file": meeting_data.agenda_file,
+        "time_block": meeting_data.time_block,
+        "remote": meeting_data.remote,
+        "tool": meeting_data.tool,
+        "meeting_type": meeting_data.meeting_type,
+        "duration": meeting_data.duration,
+        "attendees": meeting_data.attendees,
+        "agenda_clarity": [meeting_data.agenda_clarity],
+        "has_action_items": meeting_data.has_action_items,
+        "departments": str(meeting_data.departments),
+        "roles": meeting_data.roles,
+        "average_annual_salary": meeting_data.average_annual_salary,
+        "meeting_notes": meeting_data.meeting_notes,
+        "roi": prediction_data["roi"],
+    }
+
 
-        # Update user usage
-        current_user.predictions_used += 1
+def build_prediction_row(meeting_row: dict, prediction_data: dict) -> dict:
+    return {
+        "meeting_id": meeting_row["meeting_id"],
+        "user_id": meeting_row["user_id"],
+        "predicted_at": datetime.utcnow(),
+        "is_productive": prediction_data["is_productive"],
+        "confidence_score": prediction_data["confidence_score"],
+        "roi": prediction_data["roi"],
+        "estimated_cost": prediction_data["estimated_cost"],
+        "estimated_value_gain_on_meeting": prediction_data["estimated_value_gain_on_meeting"],
+        "suggestions": json.dumps(prediction_data["suggestions"]),
+    }
 
-        db.commit()
 
-    asyncio.create_task(store_meeting_and_prediction())
+def prediction_rows(user_id, meeting_data: MeetingInput, prediction_data: dict) -> tuple:
+    """(meeting row, prediction row); 500 when the model output does not fit them."""
+    try:
+        meeting_row = build_meeting_row(user_id, meeting_data, prediction_data)
+        prediction_row = validate_prediction_row(build_prediction_row(meeting_row, prediction_data))
+    except KeyError as e:
+        raise HTTPException(status_code=500, detail=f"Invalid GPT output format: missing {e}")
+    except ValueError as e:
+        raise HTTPException(status_code=500, detail=f"Invalid GPT output format: {e}")
+    return meeting_row, prediction_row
 
-    # 7️⃣ Return GPT results instantly
+
+def prediction_response(prediction_data: dict) -> dict:
     return {
         "is_productive": prediction_data["is_productive"],
         "confidence_score": prediction_data["confidence_score"],
@@ -238,3 +271,220 @@ Return ONLY valid JSON with these exact keys:
         "estimated_value_gain_on_meeting": prediction_data["estimated_value_gain_on_meeting"],
         "suggestions": prediction_data["suggestions"]
     }
+
+
+async def predict_locally(meeting_data: MeetingInput) -> dict:
+    try:
+        engine = get_inference_engine()
+    except (FileNotFoundError, ValueError):
+        raise HTTPException(status_code=503, detail="Local prediction model is not available")
+    return await asyncio.to_thread(engine.predict, meeting_data)
+
+
+@router.post("/predict_one")
+async def predict_one(meeting_data: MeetingInput, 
+                      backend: Optional[str] = None,
+                      db: AsyncSession = Depends(get_async_db), 
+                      current_user: UserSnapshot = Depends(get_current_user_snapshot)):
+
+    # 1️⃣ User's plan from the in-memory catalog
+    plan = await require_plan(current_user)
+
+    # 2️⃣ Select GPT model
+    gpt_model = select_gpt_model(plan.name)
+    use_local = select_prediction_backend(plan.name, backend) == "local"
+
+    # 3️⃣ Reserve one unit of quota atomically (403 when exhausted)
+    await reserve_predictions(db, current_user.id, plan.max_predictions_per_month)
+
+    # 4️⃣ Score in-process, serve recurring meetings from the cache, otherwise call GPT API
+    try:
+        if use_local:
+            prediction_data = await predict_locally(meeting_data)
+        else:
+            prediction_data = await predict_with_gpt(meeting_data, gpt_model, plan_token_budget(plan.name))
+
+        # 5️⃣ Hand the rows to the write-behind queue
+        meeting_row, prediction_row = prediction_rows(current_user.id, meeting_data, prediction_data)
+        await prediction_writer.enqueue(current_user.id, meeting_row, prediction_row)
+    except BaseException:
+        # Nothing was queued, so the reserved unit goes back. The request session
+        # may already be closing (e.g. on cancellation), so the refund uses its own
+        await asyncio.shield(refund_predictions_detached(current_user.id))
+        raise
+
+    # 6️⃣ Return results instantly
+    return prediction_response(prediction_data)
+
+
+@router.post("/predict_batch")
+async def predict_batch(meetings: List[MeetingInput],
+                        backend: Optional[str] = None,
+                        db: AsyncSession = Depends(get_async_db),
+                        current_user: UserSnapshot = Depends(get_current_user_snapshot)):
+    if not meetings:
+        raise HTTPException(status_code=400, detail="No meetings provided")
+    if len(meetings) > settings.PREDICT_BATCH_MAX_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch too large (max {settings.PREDICT_BATCH_MAX_SIZE} meetings)"
+        )
+
+    # 1️⃣ Reserve quota for the whole batch in one statement
+    plan = await require_plan(current_user)
+    try:
+        await reserve_predictions(db, current_user.id, plan.max_predictions_per_month, len(meetings))
+    except HTTPException:
+        remaining = plan.max_predictions_per_month - await get_predictions_used(db, current_user.id)
+        raise HTTPException(
+            status_code=403,
+            detail=f"Prediction quota exceeded ({max(remaining, 0)} predictions remaining)"
+        )
+
+    gpt_model = select_gpt_model(plan.name)
+    use_local = select_prediction_backend(plan.name, backend) == "local"
+    token_budget = plan_token_budget(plan.name)
+    user_id = current_user.id
+
+    # 2️⃣ Fan out under a bounded number of concurrent upstream calls
+    semaphore = asyncio.Semaphore(settings.PREDICT_BATCH_CONCURRENCY)
+
+    async def predict_item(meeting_data: MeetingInput):
+        async with semaphore:
+            try:
+                if use_local:
+                    return await predict_locally(meeting_data), None
+                return await predict_with_gpt(meeting_data, gpt_model, token_budget), None
+            except HTTPException as e:
+                return None, e.detail
+            except Exception as e:
+                return None, str(e)
+
+    try:
+        outcomes = await asyncio.gather(*(predict_item(m) for m in meetings))
+    except BaseException:
+        await asyncio.shield(refund_predictions_detached(user_id, len(meetings)))
+        raise
+
+    # 3️⃣ Build results in input order; the write-behind worker bulk-inserts the rows
+    results = []
+    succeeded = 0
+    try:
+        for index, (meeting_data, (prediction_data, error)) in enumerate(zip(meetings, outcomes)):
+            if error is None:
+                try:
+                    meeting_row, prediction_row = prediction_rows(user_id, meeting_data, prediction_data)
+                except HTTPException as e:
+                    error = e.detail
+            if error is not None:
+                results.append({"index": index, "status": "error", "error": error})
+                continue
+            await prediction_writer.enqueue(user_id, meeting_row, prediction_row)
+            succeeded += 1
+            results.append({
+                "index": index,
+                "status": "ok",
+                "meeting_id": str(meeting_row["meeting_id"]),
+                "prediction": prediction_response(prediction_data),
+            })
+    except BaseException:
+        # Cancelled while waiting for queue room: only queued items keep their unit
+        await asyncio.shield(refund_predictions_detached(user_id, len(meetings) - succeeded))
+        raise
+
+    # 4️⃣ Failed items do not count against the quota
+    await refund_predictions(db, user_id, len(meetings) - succeeded)
+
+    return {
+        "total": len(meetings),
+        "succeeded": succeeded,
+        "failed": len(meetings) - succeeded,
+        "results": results,
+    }
+
+
+
+STREAMED_FIELDS = ["is_productive", "confidence_score", "roi", "estimated_cost", "estimated_value_gain_on_meeting"]
+
+
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+@router.post("/predict_one/stream")
+async def predict_one_stream(meeting_data: MeetingInput,
+                             backend: Optional[str] = None,
+                             db: AsyncSession = Depends(get_async_db),
+                             current_user: UserSnapshot = Depends(get_current_user_snapshot)):
+    """
+    Server-sent-events variant of predict_one. Scalar fields are sent as soon
+    as the model has generated them, suggestions follow once the completion is
+    done, and a final `done` event carries the persisted prediction id.
+    """
+    plan = await require_plan(current_user)
+    gpt_model = select_gpt_model(plan.name)
+    use_local = select_prediction_backend(plan.name, backend) == "local"
+    token_budget = plan_token_budget(plan.name)
+    user_id = current_user.id
+    # Reserved before the response starts so an exhausted quota is still a plain 403
+    await reserve_predictions(db, user_id, plan.max_predictions_per_month)
+
+    async def events():
+        reserved = True
+        try:
+            # Local model and cache hits have everything at once
+            if use_local:
+                prediction_data = await predict_locally(meeting_data)
+            else:
+                cache_key = make_prediction_cache_key(meeting_data, gpt_model, token_budget)
+                prediction_data = await prediction_cache.get(cache_key) if prediction_cache else None
+
+            if prediction_data is not None:
+                for name in STREAMED_FIELDS:
+                    yield sse_event("field", {name: prediction_data[name]})
+            else:
+                scanner = StreamingFieldScanner(STREAMED_FIELDS)
+                prompt = build_prediction_prompt(meeting_data, token_budget, gpt_model)
+                async for delta in stream_gpt_response(gpt_model, prompt):
+                    for name, value in scanner.feed(delta):
+                        yield sse_event("field", {name: value})
+                prediction_data = json.loads(scanner.buffer)
+                if prediction_cache:
+                    await prediction_cache.set(cache_key, prediction_data)
+                # Anything the scanner could not pick out early goes out now
+                for name in STREAMED_FIELDS:
+                    if name not in scanner.emitted:
+                        yield sse_event("field", {name: prediction_data[name]})
+
+            yield sse_event("field", {"suggestions": prediction_data["suggestions"]})
+
+            meeting_row, prediction_row = prediction_rows(user_id, meeting_data, prediction_data)
+            persisted = await prediction_writer.enqueue(user_id, meeting_row, prediction_row)
+            reserved = False
+            # Shielded so a client disconnect does not cancel the shared flush result
+            prediction_id = await asyncio.shield(persisted)
+            if prediction_id is None:
+                yield sse_event("error", {"detail": "Prediction could not be saved"})
+                return
+            yield sse_event("done", {
+                "prediction_id": prediction_id,
+                "meeting_id": meeting_row["meeting_id"],
+                **prediction_response(prediction_data),
+            })
+        except json.JSONDecodeError:
+            yield sse_event("error", {"detail": "Invalid GPT output format"})
+        except HTTPException as e:
+            yield sse_event("error", {"detail": e.detail})
+        except Exception as e:
+            yield sse_event("error", {"detail": f"GPT request failed: {str(e)}"})
+        finally:
+            # Errors and client disconnects before the rows were queued give the unit back
+            # The request session is closed by the time the body streams, so use a fresh one
+            if reserved:
+                await asyncio.shield(refund_predictions_detached(user_id))
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,12 +1,16 @@
+import logging
 from datetime import datetime, timedelta , timezone
 from fastapi import Depends, HTTPException
 from jose import jwt, JWTError
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.core.config import settings
 from app.db.models import User
 from fastapi.security import OAuth2PasswordBearer
-from app.db.database import get_db
+from app.db.database import get_db, get_async_db
+from app.auth.user_cache import UserSnapshot, load_user_snapshot
 
+logger = logging.getLogger(__name__)
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
@@ -36,16 +40,34 @@ def verify_email_token(token: str):
 def get_user_by_id(db, user_id):
     return db.query(User).filter(User.id == user_id).first()
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+async def get_user_by_id_async(db: AsyncSession, user_id):
+    return await db.get(User, user_id)
+
+def decode_user_id(token: str) -> str:
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        user_id = payload.get("user_id")
-        if user_id is None:
-            raise HTTPException(status_code=401, detail="Invalid token")
-        user = get_user_by_id(db, user_id)
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found")
-        return user
     except JWTError as e:
-        print(f"JWT Error: {e}")
-        raise HTTPException(status_code=401, detail="Invalid token")
\ No newline at end of file
+        logger.info("Rejected access token: %s", e)
+        raise HTTPException(status_code=401, detail="Invalid token")
+    user_id = payload.get("user_id")
+    if user_id is None:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    return user_id
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
+    user_id = decode_user_id(token)
+    user = await get_user_by_id_async(db, user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    return user
+
+async def get_current_user_snapshot(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)) -> UserSnapshot:
+    """
+    Like get_current_user, but returns a cached immutable UserSnapshot so a
+    warm request authenticates without touching the database.
+    """
+    user_id = decode_user_id(token)
+    snapshot = await load_user_snapshot(db, user_id)
+    if not snapshot:
+        raise HTTPException(status_code=404, detail="User not found")
+    return snapshot
\ No newline at end of file
@@ -1,6 +1,9 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Request, Body
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm import Session
-from app.db.database import SessionLocal
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.database import SessionLocal, get_async_db
 from fastapi.responses import RedirectResponse
 from app.auth import schemas, utils, jwt
 from app.db.models import User
@@ -19,6 +22,8 @@ from typing import Optional
 from datetime import datetime
 from uuid import UUID
 from app.lib.email_utils import send_verification_email, send_reset_pass
+from app.auth.user_cache import invalidate_user_snapshot
+from app.db.plan_catalog import plan_catalog
 from app.auth.jwt import verify_email_token, get_current_user, get_user_by_id,create_refresh_token, create_email_token, create_access_token
 
 
@@ -41,13 +46,16 @@ class EmailRequest(BaseModel):
 def get_user_by_email(db, email):
     return db.query(User).filter(User.email == email).first()
 
+async def get_user_by_email_async(db: AsyncSession, email):
+    return (await db.execute(select(User).filter(User.email == email))).scalars().first()
+
 
 
 
 @router.post("/register")
-def register(user: RegisterUser, db: Session = Depends(get_db)):
+async def register(user: RegisterUser, db: AsyncSession = Depends(get_async_db)):
     # 1. Prevent duplicate email
-    if db.query(User).filter(User.email == user.email).first():
+    if await get_user_by_email_async(db, user.email):
         raise HTTPException(status_code=400, detail="Email already registered")
 
     # 2. Create user
@@ -55,31 +63,37 @@ def register(user: RegisterUser, db: Session = Depends(get_db)):
         id=str(uuid.uuid4()),
         full_name=user.full_name,
         email=user.email,
-        password_hash=hash_password(user.password),
+        password_hash=await hash_password_async(user.password),
         email_verified=False,
         plan_status="free",
-        created_at=datetime.now(timezone.utc),
+        # users.created_at is a naive TIMESTAMP column; asyncpg won't coerce aware datetimes
+        created_at=datetime.utcnow(),
     )
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
 
-    # 3. Fetch or create 'free' plan
-    plan = db.query(Plan).filter(Plan.name == "free").first()
+    # 3. Fetch 'free' plan from the catalog, creating it only if it does not exist yet
+    plan = await plan_catalog.get_by_name("free")
     if not plan:
-        plan = Plan(
-            name="free",
-            price_usd=0.0,
-            max_predictions_per_month=20,
-            description="Free plan with limited access"
+        # Another worker (or a stale catalog) may have created it meanwhile
+        await db.execute(
+            insert(Plan)
+            .values(
+                name="free",
+                price_usd=0.0,
+                max_predictions_per_month=20,
+                description="Free plan with limited access"
+            )
+            .on_conflict_do_nothing(index_elements=[Plan.name])
         )
-        db.add(plan)
-        db.commit()
-        db.refresh(plan)
+        await db.commit()
+        await plan_catalog.reload()
+        plan = plan_catalog.by_name("free")
 
     # 4. Associate user with the plan
     new_user.plan_id = plan.id
-    db.commit()
+    await db.commit()
 
     # 5. Create a free subscription record (not tied to Paddle)
     subscription = Subscription(
@@ -96,7 +110,7 @@ def register(user: RegisterUser, db: Session = Depends(get_db)):
         quantity=1
     )
     db.add(subscription)
-    db.commit()
+    await db.commit()
 
     return {
         "message": "User registered successfully with free plan",
@@ -104,9 +118,9 @@ def register(user: RegisterUser, db: Session = Depends(get_db)):
     }
 
 @router.post("/login", response_model = schemas.Token)
-def login_user(data: LoginRequest, db: Session = Depends(get_db)):
-    user = get_user_by_email(db, data.email)
-    if not user or not verify_password(data.password, user.password_hash):
+async def login_user(data: LoginRequest, db: AsyncSession = Depends(get_async_db)):
+    user = await get_user_by_email_async(db, data.email)
+    if not user or not await verify_password_async(data.password, user.password_hash):
         raise HTTPException(status_code=401, detail="Invalid email or password")
 
     token = create_access_token({"user_id": str(user.id)})
@@ -145,12 +159,12 @@ def refresh_token(refresh_token: str):
     
 #API for email verification
 @router.post("/send-verification-email")
-async def resend_verification_email(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def resend_verification_email(current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
     if current_user.email_verified:
         raise HTTPException(status_code=400, detail="Email already verified")
     
     token = create_email_token(str(current_user.id))
-    send_verification_email(current_user.email, token)
+    await send_verification_email(current_user.email, token)
     return {"message": "Verification email sent."}
 
 @router.get("/verify-email")
@@ -165,6 +179,7 @@ def verify_email(token: str, db: Session = Depends(get_db)):
 
     user.email_verified = True
     db.commit()
+    invalidate_user_snapshot(user.id)
     return {"message": "Email verified successfully"}
 
 @router.get("/me")
@@ -227,14 +242,15 @@ def verify_email(payload: TokenPayload, db: Session = Depends(get_db)):
 
         user.email_verified = True
         db.commit()
+        invalidate_user_snapshot(user.id)
         return {"message": "Email Verified"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 #API for passowrd reset email
 @router.post("/request-password-reset")
-async def resend_verification_email(data: ResetPasswordRequest, db: Session = Depends(get_db)):
+async def resend_verification_email(data: ResetPasswordRequest, db: AsyncSession = Depends(get_async_db)):
     # 1. Find the user by their email address
-    user = db.query(User).filter(User.email == data.email).first()
+    user = (await db.execute(select(User).filter(User.email == data.email))).scalars().first()
     if not user:
         return {"message": "Password reset email sent."}
     token = create_email_token(str(data.email))
@@ -242,14 +258,14 @@ async def resend_verification_email(data: ResetPasswordRequest, db: Session = De
     user.reset_token = token
     user.reset_token_expiry = token_expiry.replace(tzinfo=None)
     db.add(user)
-    db.commit()
-    db.refresh(user)
-    send_reset_pass(data.email, token)
+    await db.commit()
+    await db.refresh(user)
+    await send_reset_pass(data.email, token)
     return {"message": "Password reset email sent."}
 
 @router.post("/reset-password")
-def reset_password(token: str = Body(...), new_password: str = Body(...), db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.reset_token == token).first()
+async def reset_password(token: str = Body(...), new_password: str = Body(...), db: AsyncSession = Depends(get_async_db)):
+    user = (await db.execute(select(User).filter(User.reset_token == token))).scalars().first()
     if not user or not user.reset_token_expiry:
         raise HTTPException(status_code=400, detail="Invalid or expired token.")
 
@@ -257,16 +273,15 @@ def reset_password(token: str = Body(...), new_password: str = Body(...), db: Se
     if len(new_password) < 8:
         raise HTTPException(status_code=400, detail="Password too short.")
 
-    # Hash password (example with passlib)
-    from passlib.context import CryptContext
-    pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-    user.password_hash = pwd_context.hash(new_password)
+    # Hash on the shared bcrypt pool so the event loop stays free
+    user.password_hash = await hash_password_async(new_password)
 
     # Clear reset token and expiry
     user.reset_token = None
     user.reset_token_expiry = None
 
-    db.commit()
+    await db.commit()
+    invalidate_user_snapshot(user.id)
 
     return {"msg": "Password reset successful"}
 
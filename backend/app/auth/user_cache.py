@@ -0,0 +1,58 @@
+from dataclasses import dataclass
+from typing import Optional
+from uuid import UUID
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.db.models import User
+from app.lib.ttl_cache import TTLCache
+
+
+@dataclass(frozen=True)
+class UserSnapshot:
+    """
+    Immutable view of the fields hot routes need about the caller.
+    Usage counters are deliberately absent: they change on every prediction.
+    Plan details come from plan_catalog by plan_id.
+    """
+    id: UUID
+    email: str
+    email_verified: bool
+    plan_id: Optional[int]
+
+
+user_snapshot_cache = TTLCache(
+    maxsize=settings.AUTH_CACHE_MAX_ENTRIES,
+    ttl=settings.AUTH_CACHE_TTL_SECONDS,
+    name="auth",
+)
+
+
+async def load_user_snapshot(db: AsyncSession, user_id) -> Optional[UserSnapshot]:
+    """
+    Cached snapshot for user_id; on a miss, one primary-key lookup on users.
+    """
+    key = str(user_id)
+    snapshot = user_snapshot_cache.get(key)
+    if snapshot is not None:
+        return snapshot
+
+    row = (await db.execute(
+        select(User.id, User.email, User.email_verified, User.plan_id)
+        .where(User.id == user_id)
+    )).first()
+    if row is None:
+        return None
+
+    snapshot = UserSnapshot(
+        id=row[0],
+        email=row[1],
+        email_verified=bool(row[2]),
+        plan_id=row[3],
+    )
+    user_snapshot_cache.set(key, snapshot)
+    return snapshot
+
+
+def invalidate_user_snapshot(user_id):
+    user_snapshot_cache.pop(str(user_id))
@@ -1,16 +1,56 @@
 from passlib.context import CryptContext
+from fastapi import HTTPException
 from app.core.config import settings
+from app.core.metrics import PASSWORD_HASH_SECONDS
+import asyncio
 import secrets
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone, timedelta
 from jose import jwt , JWTError
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.BCRYPT_ROUNDS)
+
+# bcrypt releases the GIL, so a small thread pool gives real parallelism
+# without blocking the event loop. Jobs beyond the pending limit are rejected
+# instead of piling up behind a slow queue.
+_hash_executor = ThreadPoolExecutor(max_workers=settings.PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+_pending_hash_jobs = 0
+
+_hash_seconds = PASSWORD_HASH_SECONDS.labels("hash")
+_verify_seconds = PASSWORD_HASH_SECONDS.labels("verify")
 
 def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+    with _hash_seconds.time():
+        return pwd_context.hash(password)
 
 def verify_password(plain_password, hashed_password) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    with _verify_seconds.time():
+        return pwd_context.verify(plain_password, hashed_password)
+
+async def _run_hash_job(func, *args):
+    """Run a bcrypt call on the hashing pool, or 503 when the pool is saturated."""
+    global _pending_hash_jobs
+    if _pending_hash_jobs >= settings.PASSWORD_HASH_MAX_PENDING:
+        raise HTTPException(status_code=503, detail="Server busy, please retry", headers={"Retry-After": "1"})
+    _pending_hash_jobs += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_hash_executor, func, *args)
+    finally:
+        _pending_hash_jobs -= 1
+
+async def hash_password_async(password: str) -> str:
+    return await _run_hash_job(hash_password, password)
+
+async def verify_password_async(plain_password, hashed_password) -> bool:
+    return await _run_hash_job(verify_password, plain_password, hashed_password)
+
+def password_hash_stats() -> dict:
+    return {
+        "workers": settings.PASSWORD_HASH_WORKERS,
+        "pending": _pending_hash_jobs,
+        "max_pending": settings.PASSWORD_HASH_MAX_PENDING,
+        "rounds": settings.BCRYPT_ROUNDS,
+    }
 
 def create_reset_token(user_email: str):
     expire = datetime.now(timezone.utc) + timedelta(hours=1)
@@ -22,4 +62,4 @@ def verify_reset_token(token: str):
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
         return payload.get("sub")
     except JWTError:
-        return None
\ No newline at end of file
+        return None
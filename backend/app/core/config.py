@@ -6,13 +6,100 @@ class Settings(BaseSettings):
     ALGORITHM: str
     OPENAI_API_KEY: str
     ACCESS_TOKEN_EXPIRE_MINUTES: int
-    SMTP_USER: str
-    SMTP_PASS: str
+    SMTP_USER: str = ""  # empty = no login (e.g. a local debug server)
+    SMTP_PASS: str = ""
     FRONTEND_URL: str
     BACKEND_URL: str
     PADDLE_API_KEY: str
     PADDLE_WEBHOOK_SECRET: str
 
+    # Database connection pools (applied to both the sync and async engine)
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30.0
+    DB_POOL_RECYCLE: int = 1800  # seconds; -1 disables
+    DB_POOL_PRE_PING: bool = True
+
+    # /internal/* endpoints; when empty they only answer requests from localhost
+    INTERNAL_API_TOKEN: str = ""
+
+    # Shared OpenAI HTTP client (created once in the app lifespan)
+    OPENAI_API_URL: str = "https://api.openai.com/v1/chat/completions"
+    OPENAI_HTTP2: bool = True
+    OPENAI_MAX_CONNECTIONS: int = 100
+    OPENAI_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    OPENAI_KEEPALIVE_EXPIRY: float = 30.0
+    OPENAI_CONNECT_TIMEOUT: float = 5.0
+    OPENAI_READ_TIMEOUT: float = 60.0
+
+    # Prediction cache in front of the GPT call
+    PREDICTION_CACHE_ENABLED: bool = True
+    PREDICTION_CACHE_MAX_ENTRIES: int = 10000
+    PREDICTION_CACHE_TTL_SECONDS: float = 7 * 24 * 3600
+    PREDICTION_CACHE_SQLITE_PATH: str = ""  # empty = memory only
+
+    # In-process scikit-learn backend ("gpt" or "local")
+    ML_MODEL_DIR: str = "."
+    FREE_PLAN_PREDICTION_BACKEND: str = "gpt"
+
+    # /api/predict_batch
+    PREDICT_BATCH_MAX_SIZE: int = 500
+    PREDICT_BATCH_CONCURRENCY: int = 16
+
+    # Write-behind persistence of predictions
+    WRITE_BEHIND_QUEUE_SIZE: int = 10000
+    WRITE_BEHIND_BATCH_SIZE: int = 500
+    WRITE_BEHIND_FLUSH_INTERVAL: float = 0.05  # seconds to wait for a batch to fill
+    WRITE_BEHIND_SPILL_PATH: str = "prediction_spill.jsonl"  # each process writes <name>.<pid>.jsonl; failed rows go to <path>.dead
+    WRITE_BEHIND_FSYNC: bool = False
+    WRITE_BEHIND_MAX_ATTEMPTS: int = 5  # non-connection errors before a batch is split and bad rows dead-lettered
+
+    # Input token budget of GPT prediction prompts (app.lib.prompt_budget)
+    PROMPT_TOKEN_BUDGETS: str = "free=1500,pro=4000,business=8000,enterprise=8000"  # plan name=tokens
+    PROMPT_TOKEN_BUDGET_DEFAULT: int = 2000  # plans not listed above; 0 = unlimited
+    PROMPT_CONDENSE_CACHE_MAX_ENTRIES: int = 2000
+    PROMPT_CONDENSE_CACHE_TTL_SECONDS: float = 24 * 3600
+
+    # In-memory plan catalog (app.db.plan_catalog), one copy per worker process
+    PLAN_CATALOG_REFRESH_SECONDS: float = 60.0  # periodic re-read so plan edits reach every worker; 0 disables
+    PLAN_CATALOG_MISS_RELOAD_SECONDS: float = 5.0  # minimum catalog age before a lookup miss triggers a reload
+
+    # Per-user DashboardResponse cache
+    DASHBOARD_CACHE_MAX_ENTRIES: int = 5000
+    DASHBOARD_CACHE_TTL_SECONDS: float = 60.0
+
+    # Authenticated-user snapshot cache used by get_current_user_snapshot
+    AUTH_CACHE_MAX_ENTRIES: int = 10000
+    AUTH_CACHE_TTL_SECONDS: float = 30.0
+
+    # bcrypt cost factor and the worker pool that runs hash/verify off the event loop
+    BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = 4
+    PASSWORD_HASH_MAX_PENDING: int = 64  # queued + running jobs before answering 503
+
+    # Outgoing mail (app.lib.mail_transport)
+    SMTP_HOST: str = "smtp.gmail.com"
+    SMTP_PORT: int = 587
+    SMTP_STARTTLS: bool = True
+    SMTP_USE_TLS: bool = False  # implicit TLS, e.g. port 465
+    SMTP_TIMEOUT: float = 30.0
+    SMTP_POOL_SIZE: int = 2  # connections kept open, one per delivery worker
+    SMTP_QUEUE_SIZE: int = 1000
+    SMTP_MAX_RETRIES: int = 5
+    SMTP_RETRY_BACKOFF: float = 1.0
+    MAIL_FROM: str = "norrepl@mycompany.com"
+
+    # Background processing of stored Paddle webhook events
+    PADDLE_EVENT_BATCH_SIZE: int = 50
+    PADDLE_EVENT_POLL_INTERVAL: float = 1.0  # seconds; new events also wake the worker directly
+    PADDLE_EVENT_MAX_ATTEMPTS: int = 10
+
+    # Logging (app.core.logging_config)
+    LOG_LEVEL: str = "INFO"
+    LOG_LEVELS: str = "httpx=WARNING,httpcore=WARNING"  # per-logger overrides, e.g. "app.db=DEBUG"
+    LOG_JSON: bool = True  # False = one plain text line per record
+    LOG_QUEUE_SIZE: int = 10000  # records waiting for the writer thread; beyond that they are dropped
+
     class Config:
         env_file = ".env"
 
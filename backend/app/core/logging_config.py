@@ -0,0 +1,189 @@
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Optional
+from app.core.config import settings
+
+# Set per HTTP request by RequestIdMiddleware (and per event by background workers)
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+TEXT_FORMAT = "%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s"
+
+# Attributes every LogRecord has; anything else was passed with extra={...}
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "request_id", "taskName"}
+_exception_formatter = logging.Formatter()
+
+
+class RequestIdFilter(logging.Filter):
+    """Stamps the current request id on the record while still in the caller's context."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get() or "-"
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, message, request_id, extras and exc_info."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        request_id = getattr(record, "request_id", "-")
+        if request_id != "-":
+            entry["request_id"] = request_id
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc_info"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    Hands records to the listener thread without ever waiting: when the
+    queue is full (the output is slower than we log) the record is dropped
+    and counted, so a stalled log shipper cannot slow requests down.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Render message and traceback here, so no live objects cross threads,
+        # but keep them apart (unlike the stock prepare) for the JSON output
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _exception_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_queue_handler: Optional[NonBlockingQueueHandler] = None
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def parse_levels(spec: str) -> dict:
+    """ "app.db=DEBUG, httpx=WARNING" -> {"app.db": "DEBUG", "httpx": "WARNING"} """
+    levels = {}
+    for item in spec.split(","):
+        if "=" not in item:
+            continue
+        name, level = item.split("=", 1)
+        levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def setup_logging():
+    """
+    Routes all logging through a bounded queue to one writer thread.
+
+    The root logger (and uvicorn's loggers, which are made to propagate)
+    only gets the queue handler; formatting and stdout writes happen on
+    the QueueListener thread. Safe to call more than once.
+    """
+    global _queue_handler, _listener
+    if _listener is not None:
+        return
+
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter() if settings.LOG_JSON else logging.Formatter(TEXT_FORMAT))
+
+    log_queue = queue.Queue(maxsize=settings.LOG_QUEUE_SIZE)
+    _queue_handler = NonBlockingQueueHandler(log_queue)
+    _queue_handler.addFilter(RequestIdFilter())
+
+    root = logging.getLogger()
+    root.handlers = [_queue_handler]
+    root.setLevel(settings.LOG_LEVEL.upper())
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        uvicorn_logger = logging.getLogger(name)
+        uvicorn_logger.handlers = []
+        uvicorn_logger.propagate = True
+    for name, level in parse_levels(settings.LOG_LEVELS).items():
+        logging.getLogger(name).setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+
+
+def shutdown_logging():
+    """Writes out what is still queued and stops the writer thread."""
+    global _queue_handler, _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    logging.getLogger().removeHandler(_queue_handler)
+    _listener = None
+
+
+def logging_stats() -> dict:
+    if _queue_handler is None:
+        return {"enabled": False}
+    return {
+        "enabled": _listener is not None,
+        "queue_depth": _queue_handler.queue.qsize(),
+        "queue_capacity": settings.LOG_QUEUE_SIZE,
+        "dropped": _queue_handler.dropped,
+    }
+
+
+class RequestIdMiddleware:
+    """
+    Pure ASGI middleware (no BaseHTTPMiddleware task/stream overhead) that
+    takes X-Request-ID from the client or generates one, exposes it to log
+    records through request_id_var and echoes it on the response.
+    """
+
+    header = b"x-request-id"
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == self.header:
+                candidate = value.decode("latin-1")
+                if 0 < len(candidate) <= 128 and candidate.isprintable():
+                    request_id = candidate
+                break
+        request_id = request_id or uuid.uuid4().hex
+        encoded = request_id.encode("latin-1")
+
+        async def send_with_request_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", []), (self.header, encoded)]
+            await send(message)
+
+        token = request_id_var.set(request_id)
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            request_id_var.reset(token)
@@ -0,0 +1,117 @@
+"""
+Prometheus metrics, served at GET /metrics.
+
+With several uvicorn workers, export PROMETHEUS_MULTIPROC_DIR (an empty,
+writable directory, wiped on every deploy) before the server starts: each
+process then writes its samples to mmap'd files there and /metrics merges
+all of them. Without it /metrics reports the answering process only. Only
+counters and histograms are used, so samples left by exited workers still
+add up correctly.
+"""
+import os
+import time
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest
+from prometheus_client import multiprocess
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template",
+    ["method", "route", "status"],
+)
+GPT_REQUEST_SECONDS = Histogram(
+    "gpt_request_duration_seconds", "OpenAI chat completion latency",
+    ["model", "outcome"],
+    buckets=(0.25, 0.5, 1, 2, 3, 5, 8, 13, 20, 30, 60, 120),
+)
+DB_STATEMENT_SECONDS = Histogram(
+    "db_statement_duration_seconds", "Time in cursor.execute per statement type",
+    ["engine", "statement"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+PASSWORD_HASH_SECONDS = Histogram(
+    "password_hash_duration_seconds", "bcrypt time on the hashing pool, excluding queueing",
+    ["operation"],
+    buckets=(0.025, 0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1, 2, 5),
+)
+SMTP_SEND_SECONDS = Histogram(
+    "smtp_send_duration_seconds", "One SMTP delivery attempt, connect included when needed",
+    ["outcome"],
+)
+PADDLE_EVENT_SECONDS = Histogram(
+    "paddle_event_processing_seconds", "Applying one stored Paddle webhook event",
+    ["event_type", "outcome"],
+)
+PROMPT_TOKENS = Histogram(
+    "prompt_tokens", "Prediction prompt size before (original) and after (sent) budget condensation",
+    ["model", "stage"],
+    buckets=(250, 500, 1000, 1500, 2000, 3000, 4000, 6000, 8000, 16000, 32000, 64000, 128000),
+)
+CACHE_LOOKUPS = Counter("cache_lookups", "In-process cache lookups", ["cache", "result"])
+QUOTA_REJECTIONS = Counter("prediction_quota_rejections", "Prediction requests refused for an exhausted monthly quota")
+
+STATEMENT_TYPES = {"SELECT", "INSERT", "UPDATE", "DELETE", "WITH"}
+
+
+def statement_type(statement: str) -> str:
+    head = statement[:16].lstrip().split(None, 1)
+    keyword = head[0].upper() if head else ""
+    return keyword if keyword in STATEMENT_TYPES else "OTHER"
+
+
+def instrument_engine(engine: Engine, name: str):
+    """Times every cursor execution of `engine` (the sync_engine of an AsyncEngine works too)."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._metrics_started = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "_metrics_started", None)
+        if started is not None:
+            DB_STATEMENT_SECONDS.labels(name, statement_type(statement)).observe(time.perf_counter() - started)
+
+
+def render_metrics() -> tuple:
+    """(body, content type) for the /metrics response."""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI timing of every HTTP request. The route label is the matched
+    path template (e.g. /api/predict), never the raw path, so cardinality
+    stays bounded; unmatched requests share one label.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The router stores the matched route in the (shared) scope
+            route = scope.get("route")
+            HTTP_REQUEST_SECONDS.labels(
+                scope["method"], getattr(route, "path", "unmatched"), str(status)
+            ).observe(time.perf_counter() - started)
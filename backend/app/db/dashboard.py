@@ -0,0 +1,74 @@
+import uuid
+from fastapi import HTTPException
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from app.schemas.meeting_schemas import DashboardResponse, MeetingOverviewOut, RecentPredictionOut, UserUsage
+
+# Overview rollup, usage + plan limit and the latest predictions in a single
+# round trip. The recent list is aggregated to JSON so the result is one row.
+DASHBOARD_SQL = text("""
+WITH target AS (
+    SELECT CAST(:user_id AS uuid) AS user_id
+),
+usage AS (
+    SELECT
+        CASE WHEN p.id IS NULL THEN 0 ELSE u.predictions_used END AS predictions_used,
+        COALESCE(p.max_predictions_per_month, 0) AS max_predictions_per_month
+    FROM users u
+    JOIN target t ON u.id = t.user_id
+    LEFT JOIN plans p ON p.id = u.plan_id
+),
+recent AS (
+    SELECT mp.id, mi.meeting_title, mp.predicted_at AS date, mp.is_productive, mp.confidence_score
+    FROM meeting_predictions mp
+    JOIN target t ON mp.user_id = t.user_id
+    JOIN meetings mi ON mi.meeting_id = mp.meeting_id
+    ORDER BY mp.predicted_at DESC, mp.id DESC
+    LIMIT :recent_limit
+)
+SELECT
+    COALESCE(mo.total_estimated_cost, 0) AS total_estimated_cost,
+    COALESCE(mo.total_meeting_analyzed, 0) AS total_meeting_analyzed,
+    COALESCE(mo.total_roi, 0) AS total_roi,
+    COALESCE(mo.total_estimated_value_gain, 0) AS total_estimated_value_gain,
+    COALESCE(mo.total_productive_meetings, 0) AS total_productive_meetings,
+    COALESCE(usage.predictions_used, 0) AS predictions_used,
+    COALESCE(usage.max_predictions_per_month, 0) AS max_predictions_per_month,
+    COALESCE(
+        (SELECT json_agg(recent ORDER BY recent.date DESC, recent.id DESC) FROM recent),
+        '[]'::json
+    ) AS recent_predictions
+FROM target t
+LEFT JOIN meeting_overview mo ON mo.user_id = t.user_id
+LEFT JOIN usage ON TRUE
+""")
+
+
+def fetch_dashboard(db: Session, user_id: str, recent_limit: int = 10) -> DashboardResponse:
+    """
+    Builds the DashboardResponse for one user from a single statement.
+    """
+    try:
+        user_uuid = uuid.UUID(str(user_id))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid user id")
+
+    row = db.execute(
+        DASHBOARD_SQL, {"user_id": str(user_uuid), "recent_limit": recent_limit}
+    ).mappings().one()
+
+    return DashboardResponse(
+        overview=MeetingOverviewOut(
+            user_id=user_uuid,
+            total_estimated_cost=row["total_estimated_cost"],
+            total_meeting_analyzed=row["total_meeting_analyzed"],
+            total_roi=row["total_roi"],
+            total_estimated_value_gain=row["total_estimated_value_gain"],
+            total_productive_meetings=row["total_productive_meetings"],
+        ),
+        recent_predictions=[RecentPredictionOut(**pred) for pred in row["recent_predictions"]],
+        user_usage=UserUsage(
+            predictions_used=row["predictions_used"],
+            max_predictions_per_month=row["max_predictions_per_month"],
+        ),
+    )
@@ -1,13 +1,57 @@
 from sqlalchemy import create_engine, MetaData,Table
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
 from app.core.config import settings
+from app.core.metrics import instrument_engine
+from app.db.pool_stats import instrumented_pool_class, sync_pool_stats, async_pool_stats
 
 
 SQLALCHEMY_DATABASE_URL = settings.DATABASE_URL
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+
+def make_async_database_url(url: str):
+    """
+    Derives the asyncpg URL from DATABASE_URL (postgres://, postgresql:// or
+    postgresql+psycopg2://). libpq's sslmode is translated to asyncpg's ssl.
+    """
+    url = make_url(url.replace("postgres://", "postgresql://", 1))
+    query = dict(url.query)
+    if "sslmode" in query:
+        query["ssl"] = query.pop("sslmode")
+    return url.set(drivername="postgresql+asyncpg", query=query)
+
+
+POOL_OPTIONS = dict(
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT,
+    pool_recycle=settings.DB_POOL_RECYCLE,
+    pool_pre_ping=settings.DB_POOL_PRE_PING,
+)
+
+# Sync engine: threadpool routes, the write-behind worker and ML/training scripts
+engine = create_engine(
+    SQLALCHEMY_DATABASE_URL,
+    poolclass=instrumented_pool_class(QueuePool, sync_pool_stats),
+    **POOL_OPTIONS
+)
+sync_pool_stats.attach(engine)
+instrument_engine(engine, "sync")
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# Async engine: `async def` routes, so queries never block the event loop
+async_engine = create_async_engine(
+    make_async_database_url(SQLALCHEMY_DATABASE_URL),
+    poolclass=instrumented_pool_class(AsyncAdaptedQueuePool, async_pool_stats),
+    **POOL_OPTIONS
+)
+async_pool_stats.attach(async_engine.sync_engine)
+instrument_engine(async_engine.sync_engine, "async")
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
 def get_db():
@@ -17,3 +61,6 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,104 @@
+import argparse
+import time
+from collections import defaultdict
+from typing import Optional
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from app.db.models import MeetingOverview
+
+OVERVIEW_COLUMNS = [
+    "total_estimated_cost",
+    "total_meeting_analyzed",
+    "total_roi",
+    "total_estimated_value_gain",
+    "total_productive_meetings",
+]
+
+
+def overview_deltas(entries: list) -> dict:
+    """
+    Sums write-behind entries ({"user_id", "prediction"}) into one
+    meeting_overview delta per user.
+    """
+    deltas = defaultdict(lambda: dict.fromkeys(OVERVIEW_COLUMNS, 0))
+    for entry in entries:
+        prediction = entry["prediction"]
+        delta = deltas[str(entry["user_id"])]
+        delta["total_estimated_cost"] += prediction.get("estimated_cost") or 0
+        delta["total_meeting_analyzed"] += 1
+        # Local-model predictions carry no roi / value gain (NULL); they add nothing here
+        if prediction.get("roi") is not None:
+            delta["total_roi"] += prediction["roi"]
+        if prediction.get("estimated_value_gain_on_meeting") is not None:
+            delta["total_estimated_value_gain"] += prediction["estimated_value_gain_on_meeting"]
+        delta["total_productive_meetings"] += 1 if prediction.get("is_productive") else 0
+    return deltas
+
+
+def apply_overview_deltas(session: Session, deltas: dict):
+    """
+    Adds the per-user deltas to meeting_overview in a single upsert. Runs in
+    the caller's transaction so the rollup commits with the predictions.
+    """
+    if not deltas:
+        return
+    table = MeetingOverview.__table__
+    stmt = insert(table).values([
+        {"user_id": user_id, **delta} for user_id, delta in deltas.items()
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.user_id],
+        set_={column: table.c[column] + stmt.excluded[column] for column in OVERVIEW_COLUMNS},
+    )
+    session.execute(stmt)
+
+
+REBUILD_SQL = """
+INSERT INTO meeting_overview (
+    user_id, total_estimated_cost, total_meeting_analyzed, total_roi,
+    total_estimated_value_gain, total_productive_meetings
+)
+SELECT
+    mi.user_id,
+    COALESCE(SUM(mp.estimated_cost), 0),
+    COUNT(mp.id),
+    COALESCE(SUM(mp.roi), 0),
+    COALESCE(SUM(mp.estimated_value_gain_on_meeting), 0),
+    COUNT(*) FILTER (WHERE mp.is_productive = TRUE)
+FROM meeting_predictions mp
+JOIN meetings mi ON mp.meeting_id = mi.meeting_id
+{where}
+GROUP BY mi.user_id
+"""
+
+
+def rebuild_meeting_overview(session: Session, user_id: Optional[str] = None) -> int:
+    """
+    Recomputes meeting_overview from meeting_predictions, for one user or for
+    everyone. The table is locked against concurrent delta upserts meanwhile.
+    Returns the number of rollup rows written.
+    """
+    session.execute(text("LOCK TABLE meeting_overview IN EXCLUSIVE MODE"))
+    if user_id:
+        session.execute(text("DELETE FROM meeting_overview WHERE user_id = :user_id"), {"user_id": user_id})
+        result = session.execute(text(REBUILD_SQL.format(where="WHERE mi.user_id = :user_id")), {"user_id": user_id})
+    else:
+        session.execute(text("DELETE FROM meeting_overview"))
+        result = session.execute(text(REBUILD_SQL.format(where="")))
+    session.commit()
+    return result.rowcount
+
+
+if __name__ == "__main__":
+    # Backfill / repair: python -m app.db.meeting_overview [--user-id <uuid>]
+    from app.db.database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Rebuild the meeting_overview rollup table")
+    parser.add_argument("--user-id", help="only rebuild this user's row")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    with SessionLocal() as session:
+        rows = rebuild_meeting_overview(session, args.user_id)
+    print(f"Rebuilt {rows} meeting_overview rows in {time.perf_counter() - started:.2f}s")
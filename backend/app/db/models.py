@@ -1,5 +1,5 @@
-from sqlalchemy import Column, String, Text, Boolean, DECIMAL, DateTime, Numeric, TIMESTAMP, ForeignKey, Integer, Float
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import Column, String, Text, Boolean, DECIMAL, DateTime, Numeric, TIMESTAMP, ForeignKey, Integer, Float, Index, text
+from sqlalchemy.dialects.postgresql import UUID, JSONB
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from datetime import datetime, timezone
@@ -57,6 +57,7 @@ class Plan(Base):
     price_usd = Column(DECIMAL(10, 2), nullable=False)
     max_predictions_per_month = Column(Integer, nullable=False)
     description = Column(Text)
+    paddle_price_id = Column(String, unique=True, nullable=True)
 
     # Reverse relationship: one plan has many users
     subscriptions = relationship("Subscription", back_populates="plan")
@@ -116,9 +117,14 @@ class Meeting(Base):
 
 class MeetingPrediction(Base):
     __tablename__ = "meeting_predictions"
+    __table_args__ = (
+        # Per-user "most recent first" reads and keyset pagination
+        Index("ix_meeting_predictions_user_predicted_at", "user_id", text("predicted_at DESC"), text("id DESC")),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     meeting_id = Column(UUID(as_uuid=True), ForeignKey("meetings.meeting_id"), nullable=False)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=True)  # denormalized from meetings
     is_productive = Column(Boolean, nullable=False)
     confidence_score = Column(Integer, nullable=False)
     roi = Column(Float, nullable=True)
@@ -127,4 +133,25 @@ class MeetingPrediction(Base):
     suggestions = Column(Text, nullable=True)  # store as JSON string
     predicted_at = Column(DateTime, default=datetime.utcnow)
 
-    meeting = relationship("Meeting", back_populates="predictions")
\ No newline at end of file
+    meeting = relationship("Meeting", back_populates="predictions")
+
+
+class PaddleEvent(Base):
+    __tablename__ = "paddle_events"
+    __table_args__ = (
+        # The worker only ever scans events that still need processing
+        Index("ix_paddle_events_pending", "id", postgresql_where=text("processed_at IS NULL")),
+        Index("ix_paddle_events_subscription", "subscription_id", "occurred_at"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    event_id = Column(String, unique=True, nullable=False)  # Paddle's evt_... id
+    event_type = Column(String, nullable=False)
+    subscription_id = Column(String, nullable=True)  # events of one subscription are applied in order
+    occurred_at = Column(DateTime(timezone=True), nullable=False)
+    payload = Column(JSONB, nullable=False)
+    received_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    processed_at = Column(DateTime(timezone=True), nullable=True)
+    attempts = Column(Integer, default=0, nullable=False)
+    next_attempt_at = Column(DateTime(timezone=True), nullable=True)
+    last_error = Column(Text, nullable=True)
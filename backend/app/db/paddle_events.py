@@ -0,0 +1,213 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Optional
+from sqlalchemy import text, update, func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.logging_config import request_id_var
+from app.core.metrics import PADDLE_EVENT_SECONDS
+from app.db.database import AsyncSessionLocal
+from app.db.models import PaddleEvent
+
+logger = logging.getLogger(__name__)
+
+
+def parse_paddle_timestamp(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+def event_subscription_id(data: dict) -> Optional[str]:
+    """The subscription an event belongs to, which is its ordering key."""
+    event_data = data.get("data") or {}
+    if str(data.get("event_type", "")).startswith("subscription."):
+        return event_data.get("id")
+    return event_data.get("subscription_id")
+
+
+async def record_paddle_event(db: AsyncSession, data: dict, body: bytes) -> bool:
+    """
+    Stores a webhook event once. Returns False when this event_id was already
+    recorded, i.e. the delivery is a Paddle retry.
+    """
+    # Paddle always sends event_id; the body hash keeps odd payloads idempotent too
+    event_id = data.get("event_id") or "sha256:" + hashlib.sha256(body).hexdigest()
+    inserted = await db.scalar(
+        insert(PaddleEvent)
+        .values(
+            event_id=event_id,
+            event_type=data.get("event_type") or "unknown",
+            subscription_id=event_subscription_id(data),
+            occurred_at=parse_paddle_timestamp(data.get("occurred_at")) or datetime.now(timezone.utc),
+            payload=data,
+        )
+        .on_conflict_do_nothing(index_elements=[PaddleEvent.event_id])
+        .returning(PaddleEvent.id)
+    )
+    await db.commit()
+    return inserted is not None
+
+
+# Oldest pending event of each subscription (events without one stand alone),
+# skipping rows another worker holds. Retry delays are applied after picking
+# the head so a failing event is never overtaken by a later one.
+# subscription.* events carry the full subscription state, so one that
+# arrives after a newer one was already applied is flagged as superseded.
+CLAIM_SQL = text("""
+WITH heads AS (
+    SELECT DISTINCT ON (COALESCE(subscription_id, event_id)) id, next_attempt_at
+    FROM paddle_events
+    WHERE processed_at IS NULL
+    ORDER BY COALESCE(subscription_id, event_id), occurred_at, id
+)
+SELECT e.id, e.event_id, e.event_type, e.payload, e.attempts,
+       e.event_type LIKE 'subscription.%' AND EXISTS (
+           SELECT 1 FROM paddle_events p
+           WHERE p.subscription_id = e.subscription_id
+             AND p.event_type LIKE 'subscription.%'
+             AND p.processed_at IS NOT NULL
+             AND p.last_error IS NULL
+             AND p.occurred_at > e.occurred_at
+       ) AS superseded
+FROM paddle_events e
+JOIN heads h ON h.id = e.id
+WHERE h.next_attempt_at IS NULL OR h.next_attempt_at <= NOW()
+ORDER BY e.occurred_at, e.id
+LIMIT :limit
+FOR UPDATE OF e SKIP LOCKED
+""")
+
+
+class PaddleEventWorker:
+    """
+    Applies stored Paddle events in the background.
+
+    Each round claims the head event of up to batch_size subscriptions with
+    FOR UPDATE SKIP LOCKED, so several app processes can run a worker
+    without double-processing. The claiming transaction stays open while
+    the handler runs in its own session, and processed_at is set in that
+    same transaction, so the row lock covers the whole apply. Failures are
+    retried with exponential backoff; after max_attempts the event is
+    closed with its last_error so later events of that subscription move on.
+    """
+
+    def __init__(self, handler: Callable[[AsyncSession, dict], Awaitable[None]],
+                 batch_size: int, poll_interval: float, max_attempts: int):
+        self.handler = handler
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self._wakeup: Optional[asyncio.Event] = None
+        self._worker: Optional[asyncio.Task] = None
+
+        # Metrics
+        self.processed = 0
+        self.failures = 0
+        self.dead_lettered = 0
+        self.duplicates = 0
+        self.superseded = 0
+        self.last_batch_seconds = 0.0
+
+    async def start(self):
+        self._wakeup = asyncio.Event()
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._worker is None:
+            return
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+
+    def notify(self):
+        """Called after an event is recorded so it is picked up without waiting for the next poll."""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            try:
+                handled = await self.process_pending()
+            except Exception as e:
+                logger.exception("Paddle event worker round failed")
+                handled = 0
+            if handled:
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def process_pending(self) -> int:
+        """Runs one claim round; returns how many events it handled."""
+        started = time.perf_counter()
+        async with AsyncSessionLocal() as claim_db:
+            events = (await claim_db.execute(CLAIM_SQL, {"limit": self.batch_size})).mappings().all()
+            for event in events:
+                await self._apply(claim_db, event)
+            await claim_db.commit()
+        if events:
+            self.last_batch_seconds = time.perf_counter() - started
+        return len(events)
+
+    async def _apply(self, claim_db: AsyncSession, event):
+        if event["superseded"]:
+            self.superseded += 1
+            await claim_db.execute(
+                update(PaddleEvent)
+                .where(PaddleEvent.id == event["id"])
+                .values(processed_at=func.now(), last_error="superseded by a newer event")
+            )
+            return
+        payload = event["payload"]
+        if isinstance(payload, str):
+            payload = json.loads(payload)
+        # Log lines written while applying carry the event id as their request id
+        token = request_id_var.set(f"paddle:{event['event_id']}")
+        started = time.perf_counter()
+        try:
+            async with AsyncSessionLocal() as db:
+                await self.handler(db, payload)
+        except Exception as e:
+            PADDLE_EVENT_SECONDS.labels(event["event_type"], "failed").observe(time.perf_counter() - started)
+            attempts = event["attempts"] + 1
+            self.failures += 1
+            values = {"attempts": attempts, "last_error": str(e)[:2000]}
+            if attempts >= self.max_attempts:
+                self.dead_lettered += 1
+                values["processed_at"] = func.now()
+                logger.error("Giving up on Paddle event %s after %d attempts: %s", event["event_id"], attempts, e)
+            else:
+                delay = min(2 ** attempts, 3600)
+                values["next_attempt_at"] = func.now() + timedelta(seconds=delay)
+                logger.warning("Paddle event %s failed, retrying in %ds: %s", event["event_id"], delay, e)
+            await claim_db.execute(update(PaddleEvent).where(PaddleEvent.id == event["id"]).values(**values))
+            return
+        finally:
+            request_id_var.reset(token)
+        PADDLE_EVENT_SECONDS.labels(event["event_type"], "processed").observe(time.perf_counter() - started)
+        self.processed += 1
+        await claim_db.execute(
+            update(PaddleEvent)
+            .where(PaddleEvent.id == event["id"])
+            .values(processed_at=func.now(), attempts=event["attempts"] + 1, last_error=None)
+        )
+
+    def stats(self) -> dict:
+        return {
+            "processed": self.processed,
+            "failures": self.failures,
+            "dead_lettered": self.dead_lettered,
+            "duplicates": self.duplicates,
+            "superseded": self.superseded,
+            "last_batch_seconds": round(self.last_batch_seconds, 4),
+        }
@@ -0,0 +1,190 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Iterable, Optional
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.db.database import AsyncSessionLocal
+from app.db.models import Plan
+
+logger = logging.getLogger(__name__)
+CENT = Decimal("0.01")
+
+
+def price_key(price) -> Optional[Decimal]:
+    """Exact lookup key for a price: floats from Paddle and DECIMAL(10,2) from the DB agree to the cent."""
+    if price is None:
+        return None
+    return Decimal(str(price)).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+@dataclass(frozen=True)
+class PlanInfo:
+    id: int
+    name: str
+    price_usd: Decimal
+    max_predictions_per_month: Optional[int]
+    description: Optional[str]
+    paddle_price_id: Optional[str]
+
+    @classmethod
+    def from_row(cls, plan: Plan) -> "PlanInfo":
+        return cls(
+            id=plan.id,
+            name=plan.name,
+            price_usd=price_key(plan.price_usd),
+            max_predictions_per_month=plan.max_predictions_per_month,
+            description=plan.description,
+            paddle_price_id=plan.paddle_price_id,
+        )
+
+
+class PlanCatalog:
+    """
+    All rows of `plans`, held in memory and indexed by id, lower-cased name,
+    price and Paddle price id. Each worker process holds its own copy:
+    start() loads it (startup fails if it cannot) and then re-reads it every
+    refresh_interval seconds, so edits reach every worker. The async getters
+    also reload once on a miss, at most every miss_reload_interval seconds.
+    """
+
+    def __init__(self, refresh_interval: float = 0.0, miss_reload_interval: float = 5.0):
+        self.refresh_interval = refresh_interval
+        self.miss_reload_interval = miss_reload_interval
+        self._indexes = ({}, {}, {}, {})
+        self.loaded_at: Optional[datetime] = None
+        self._loaded_monotonic = 0.0
+        self._reload_lock: Optional[asyncio.Lock] = None
+        self._refresher: Optional[asyncio.Task] = None
+
+        # Metrics
+        self.reloads = 0
+        self.reload_failures = 0
+        self.miss_reloads = 0
+
+    def replace(self, plans: Iterable[PlanInfo]) -> int:
+        by_id, by_name, by_price, by_paddle_price_id = {}, {}, {}, {}
+        for plan in sorted(plans, key=lambda p: p.id):
+            by_id[plan.id] = plan
+            # Several plans can share a price (Free and Enterprise are both 0.00):
+            # the lowest id wins, as the old `.first()` query did
+            by_name.setdefault(plan.name.lower(), plan)
+            by_price.setdefault(plan.price_usd, plan)
+            if plan.paddle_price_id:
+                by_paddle_price_id[plan.paddle_price_id] = plan
+        # One assignment so readers never see a half-built catalog
+        self._indexes = (by_id, by_name, by_price, by_paddle_price_id)
+        self.loaded_at = datetime.utcnow()
+        self._loaded_monotonic = time.monotonic()
+        self.reloads += 1
+        return len(by_id)
+
+    async def load(self, db: AsyncSession) -> int:
+        rows = (await db.execute(select(Plan))).scalars().all()
+        return self.replace(PlanInfo.from_row(row) for row in rows)
+
+    def load_sync(self, session: Session) -> int:
+        """For scripts running on the synchronous engine."""
+        rows = session.execute(select(Plan)).scalars().all()
+        return self.replace(PlanInfo.from_row(row) for row in rows)
+
+    async def reload(self) -> int:
+        async with AsyncSessionLocal() as db:
+            return await self.load(db)
+
+    # --- lifecycle -------------------------------------------------------
+
+    async def start(self):
+        await self.reload()
+        if self.refresh_interval > 0:
+            self._refresher = asyncio.create_task(self._refresh_periodically())
+
+    async def stop(self):
+        if self._refresher is None:
+            return
+        self._refresher.cancel()
+        try:
+            await self._refresher
+        except asyncio.CancelledError:
+            pass
+        self._refresher = None
+
+    async def _refresh_periodically(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.reload()
+            except Exception as e:
+                self.reload_failures += 1
+                logger.warning("Plan catalog refresh failed, keeping %d plans: %s", len(self._indexes[0]), e)
+
+    async def reload_on_miss(self) -> bool:
+        """
+        Reloads after a lookup found nothing, unless the catalog is younger
+        than miss_reload_interval. Concurrent misses share one reload.
+        Returns whether the catalog is now fresh.
+        """
+        if self._reload_lock is None:
+            self._reload_lock = asyncio.Lock()
+        async with self._reload_lock:
+            if time.monotonic() - self._loaded_monotonic < self.miss_reload_interval:
+                return True
+            self.miss_reloads += 1
+            try:
+                await self.reload()
+            except Exception as e:
+                self.reload_failures += 1
+                logger.warning("Plan catalog reload after a lookup miss failed: %s", e)
+                return False
+        return True
+
+    # --- lookups ---------------------------------------------------------
+
+    async def get_by_id(self, plan_id) -> Optional[PlanInfo]:
+        """by_id, reloading once when the plan is not known yet."""
+        plan = self.by_id(plan_id)
+        if plan is None and await self.reload_on_miss():
+            plan = self.by_id(plan_id)
+        return plan
+
+    async def get_by_name(self, name: str) -> Optional[PlanInfo]:
+        """by_name, reloading once when the plan is not known yet."""
+        plan = self.by_name(name)
+        if plan is None and await self.reload_on_miss():
+            plan = self.by_name(name)
+        return plan
+
+    def by_id(self, plan_id) -> Optional[PlanInfo]:
+        return self._indexes[0].get(plan_id)
+
+    def by_name(self, name: str) -> Optional[PlanInfo]:
+        return self._indexes[1].get(name.lower()) if name else None
+
+    def by_price(self, price) -> Optional[PlanInfo]:
+        return self._indexes[2].get(price_key(price))
+
+    def by_paddle_price_id(self, paddle_price_id: str) -> Optional[PlanInfo]:
+        return self._indexes[3].get(paddle_price_id) if paddle_price_id else None
+
+    def all(self) -> list:
+        return list(self._indexes[0].values())
+
+    def stats(self) -> dict:
+        return {
+            "plans": len(self._indexes[0]),
+            "loaded_at": self.loaded_at.isoformat() if self.loaded_at else None,
+            "reloads": self.reloads,
+            "miss_reloads": self.miss_reloads,
+            "reload_failures": self.reload_failures,
+        }
+
+
+plan_catalog = PlanCatalog(
+    refresh_interval=settings.PLAN_CATALOG_REFRESH_SECONDS,
+    miss_reload_interval=settings.PLAN_CATALOG_MISS_RELOAD_SECONDS,
+)
@@ -0,0 +1,117 @@
+import threading
+import time
+from collections import deque
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine
+
+
+class PoolStats:
+    """
+    Counters for one engine's connection pool. Checkout wait time is how long
+    a caller blocked before the pool handed it a connection.
+    """
+
+    def __init__(self, name: str, sample_size: int = 2048):
+        self.name = name
+        self._lock = threading.Lock()
+        self._waits = deque(maxlen=sample_size)
+        self.checkouts = 0
+        self.checkins = 0
+        self.connects = 0
+        self.invalidations = 0
+        self.timeouts = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.max_in_use = 0
+        self.max_overflow_seen = 0
+        self.engine = None
+
+    def record_wait(self, seconds: float):
+        with self._lock:
+            self._waits.append(seconds)
+            self.total_wait_seconds += seconds
+            self.max_wait_seconds = max(self.max_wait_seconds, seconds)
+
+    def attach(self, engine: Engine):
+        self.engine = engine
+
+        @event.listens_for(engine, "connect")
+        def on_connect(dbapi_connection, connection_record):
+            self.connects += 1
+
+        @event.listens_for(engine, "checkout")
+        def on_checkout(dbapi_connection, connection_record, connection_proxy):
+            self.checkouts += 1
+            pool = engine.pool
+            self.max_in_use = max(self.max_in_use, pool.checkedout())
+            self.max_overflow_seen = max(self.max_overflow_seen, pool.overflow())
+
+        @event.listens_for(engine, "checkin")
+        def on_checkin(dbapi_connection, connection_record):
+            self.checkins += 1
+
+        @event.listens_for(engine, "invalidate")
+        def on_invalidate(dbapi_connection, connection_record, exception):
+            self.invalidations += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            waits = sorted(self._waits)
+        pool = self.engine.pool if self.engine is not None else None
+
+        def percentile(p: float) -> float:
+            if not waits:
+                return 0.0
+            return round(waits[min(len(waits) - 1, int(p * len(waits)))] * 1000, 3)
+
+        return {
+            "pool_size": pool.size() if pool else None,
+            "in_use": pool.checkedout() if pool else None,
+            "idle": pool.checkedin() if pool else None,
+            # QueuePool counts overflow from -pool_size; only report real overflow
+            "overflow": max(0, pool.overflow()) if pool else None,
+            "max_in_use": self.max_in_use,
+            "max_overflow_seen": self.max_overflow_seen,
+            "checkouts": self.checkouts,
+            "checkins": self.checkins,
+            "connects": self.connects,
+            "invalidations": self.invalidations,
+            "timeouts": self.timeouts,
+            "checkout_wait_ms": {
+                "avg": round(self.total_wait_seconds / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                "p50": percentile(0.50),
+                "p95": percentile(0.95),
+                "p99": percentile(0.99),
+                "max": round(self.max_wait_seconds * 1000, 3),
+            },
+        }
+
+
+def instrumented_pool_class(base, stats: PoolStats):
+    """
+    Subclass of a QueuePool flavour that times every checkout. The stats
+    object lives on the class so it survives Pool.recreate().
+    """
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return base._do_get(self)
+        except exc.TimeoutError:
+            stats.timeouts += 1
+            raise
+        finally:
+            stats.record_wait(time.perf_counter() - started)
+
+    return type(f"Instrumented{base.__name__}", (base,), {"_do_get": _do_get, "stats": stats})
+
+
+sync_pool_stats = PoolStats("sync")
+async_pool_stats = PoolStats("async")
+
+
+def pool_stats() -> dict:
+    return {
+        "sync": sync_pool_stats.snapshot(),
+        "async": async_pool_stats.snapshot(),
+    }
@@ -0,0 +1,58 @@
+from typing import Optional
+from sqlalchemy import func, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import HTTPException
+from app.core.metrics import QUOTA_REJECTIONS
+from app.db.database import AsyncSessionLocal
+from app.db.models import User
+
+
+async def reserve_predictions(db: AsyncSession, user_id, limit: Optional[int], count: int = 1) -> int:
+    """
+    Atomically take `count` units of the user's monthly quota before any
+    upstream work. The check and the increment are one UPDATE that commits
+    immediately, so concurrent requests cannot overshoot the limit and the
+    row lock is held only for that statement. The commit also hands the
+    request's connection back to the pool before the slow upstream call.
+    A NULL limit is unlimited.
+
+    Returns the new predictions_used; raises 403 when the quota is exhausted.
+    """
+    stmt = (
+        update(User)
+        .where(User.id == user_id)
+        .values(predictions_used=User.predictions_used + count)
+        .returning(User.predictions_used)
+    )
+    if limit is not None:
+        stmt = stmt.where(User.predictions_used + count <= limit)
+
+    used = (await db.execute(stmt)).scalar()
+    await db.commit()
+
+    if used is None:
+        QUOTA_REJECTIONS.inc()
+        raise HTTPException(status_code=403, detail="Prediction quota exceeded")
+    return used
+
+
+async def refund_predictions(db: AsyncSession, user_id, count: int = 1):
+    """Give back units reserved for predictions that never got produced."""
+    if count <= 0:
+        return
+    await db.execute(
+        update(User)
+        .where(User.id == user_id)
+        .values(predictions_used=func.greatest(User.predictions_used - count, 0))
+    )
+    await db.commit()
+
+
+async def refund_predictions_detached(user_id, count: int = 1):
+    """
+    refund_predictions on a session of its own, for cleanup paths (errors,
+    cancellation, streamed bodies) where the request's session may already
+    be closed or closing.
+    """
+    async with AsyncSessionLocal() as db:
+        await refund_predictions(db, user_id, count)
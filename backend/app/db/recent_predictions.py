@@ -0,0 +1,49 @@
+import uuid
+from datetime import datetime
+from typing import Optional
+from fastapi import HTTPException
+from sqlalchemy import select, tuple_
+from sqlalchemy.orm import Session
+from app.db.models import Meeting, MeetingPrediction
+
+
+def encode_cursor(predicted_at: datetime, prediction_id) -> str:
+    return f"{predicted_at.isoformat()},{prediction_id}"
+
+
+def decode_cursor(cursor: str) -> tuple:
+    try:
+        predicted_at, prediction_id = cursor.split(",", 1)
+        return datetime.fromisoformat(predicted_at), uuid.UUID(prediction_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid 'before' cursor")
+
+
+def get_recent_predictions(db: Session, user_id, limit: int = 10, before: Optional[str] = None):
+    """
+    One page of a user's predictions, newest first, walking the
+    (user_id, predicted_at DESC, id DESC) index. `before` is the cursor of the
+    last row on the previous page. Returns (rows, next_cursor).
+    """
+    query = (
+        select(
+            MeetingPrediction.id,
+            Meeting.meeting_title,
+            MeetingPrediction.predicted_at.label("date"),
+            MeetingPrediction.is_productive,
+            MeetingPrediction.confidence_score,
+        )
+        .join(Meeting, Meeting.meeting_id == MeetingPrediction.meeting_id)
+        .where(MeetingPrediction.user_id == user_id)
+        .order_by(MeetingPrediction.predicted_at.desc(), MeetingPrediction.id.desc())
+        .limit(limit)
+    )
+    if before:
+        before_at, before_id = decode_cursor(before)
+        query = query.where(
+            tuple_(MeetingPrediction.predicted_at, MeetingPrediction.id) < tuple_(before_at, before_id)
+        )
+
+    rows = db.execute(query).all()
+    next_cursor = encode_cursor(rows[-1].date, rows[-1].id) if len(rows) == limit else None
+    return rows, next_cursor
@@ -0,0 +1,460 @@
+import asyncio
+import fcntl
+import json
+import logging
+import math
+import os
+import re
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import exc
+from sqlalchemy.dialects.postgresql import insert
+from app.core.config import settings
+from app.db.database import SessionLocal
+from app.db.models import Meeting, MeetingPrediction
+from app.db.meeting_overview import apply_overview_deltas, overview_deltas
+from app.db.quota import refund_predictions_detached
+from app.lib.dashboard_cache import invalidate_dashboard
+
+logger = logging.getLogger(__name__)
+
+PREDICTION_KEYS = (
+    "meeting_id", "user_id", "predicted_at", "is_productive", "confidence_score",
+    "roi", "estimated_cost", "estimated_value_gain_on_meeting", "suggestions",
+)
+OPTIONAL_NUMBERS = ("roi", "estimated_cost", "estimated_value_gain_on_meeting")
+
+
+class PredictionWriteError(Exception):
+    """The prediction could not be stored and was moved to the dead-letter file."""
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+
+def validate_prediction_row(row: dict) -> dict:
+    """
+    Checks a meeting_predictions row before it is queued, so malformed model
+    output fails its own request instead of the batch it would be written
+    with. Returns the row with confidence_score as an int; raises ValueError.
+    """
+    missing = [key for key in PREDICTION_KEYS if key not in row]
+    if missing:
+        raise ValueError(f"Prediction is missing {', '.join(missing)}")
+    if not isinstance(row["is_productive"], bool):
+        raise ValueError("is_productive must be a boolean")
+    if not _is_number(row["confidence_score"]):
+        raise ValueError("confidence_score must be a number")
+    for key in OPTIONAL_NUMBERS:
+        if row[key] is not None and not _is_number(row[key]):
+            raise ValueError(f"{key} must be a number")
+    if row["suggestions"] is not None and not isinstance(row["suggestions"], str):
+        raise ValueError("suggestions must be a JSON string")
+    return {**row, "confidence_score": round(row["confidence_score"])}
+
+
+def is_transient_db_error(error: Exception) -> bool:
+    """Connection loss, failover, pool timeouts, deadlocks: worth retrying as they are."""
+    return (
+        isinstance(error, (exc.OperationalError, exc.InterfaceError, exc.TimeoutError))
+        or getattr(error, "connection_invalidated", False)
+    )
+
+
+def process_spill_path(spill_path: str, pid: int) -> str:
+    """prediction_spill.jsonl -> prediction_spill.<pid>.jsonl"""
+    stem, ext = os.path.splitext(spill_path)
+    return f"{stem}.{pid}{ext}"
+
+
+class PredictionWriter:
+    """
+    Write-behind stage for Meeting/MeetingPrediction rows.
+
+    Routes enqueue rows and return immediately. A single worker task drains
+    the bounded queue in batches and writes each batch with one multi-row
+    insert per table plus one meeting_overview upsert, using its
+    own session on a worker thread so the event loop never blocks on the DB.
+
+    Every entry is appended to a spill file of this process before the
+    worker can see it, so writes that were accepted but not yet flushed are
+    replayed after a crash. Each uvicorn worker keeps its own spill file
+    (locked while the process lives); on start, spill files left by
+    processes that are gone are carried over and replayed. Replays are
+    idempotent because meeting_id is generated up front.
+
+    Connection errors are retried until the database is back. Any other
+    error is retried max_attempts times; the batch is then written in
+    halves until the offending rows are isolated, and those are appended
+    to the dead-letter file (their quota units refunded) instead of
+    blocking the queue.
+    """
+
+    def __init__(self, spill_path: str, queue_size: int, batch_size: int,
+                 flush_interval: float, fsync: bool = False, max_attempts: int = 5):
+        self.base_spill_path = spill_path
+        self.spill_path = process_spill_path(spill_path, os.getpid())
+        self.committed_path = f"{self.spill_path}.committed"
+        self.dead_letter_path = f"{spill_path}.dead"
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.max_attempts = max_attempts
+        self._queue: Optional[asyncio.Queue] = None
+        self._queue_size = queue_size
+        self._worker: Optional[asyncio.Task] = None
+        self._spill = None
+        self._seq = 0
+        self._committed_seq = 0
+        self._done_seqs = set()  # committed, but behind a lower seq that is not yet
+        self._unflushed = 0
+
+        # Metrics
+        self.enqueued = 0
+        self.written = 0
+        self.flushes = 0
+        self.flush_failures = 0
+        self.dead_lettered = 0
+        self.replayed = 0
+        self.max_queue_depth = 0
+        self.last_flush_seconds = 0.0
+        self.max_flush_seconds = 0.0
+        self._total_flush_seconds = 0.0
+
+    # --- lifecycle -------------------------------------------------------
+
+    async def start(self):
+        # Resolved here rather than at import so a forked worker gets its own file
+        self.spill_path = process_spill_path(self.base_spill_path, os.getpid())
+        self.committed_path = f"{self.spill_path}.committed"
+        pending = self._take_over_spills()
+        self._seq = len(pending)
+        self._committed_seq = 0
+        self._done_seqs.clear()
+        # Leftovers of several dead workers can exceed the usual capacity; the
+        # queue grows to hold them so startup never waits on a put
+        self._queue = asyncio.Queue(maxsize=max(self._queue_size, len(pending)))
+        for entry in pending:
+            self._unflushed += 1
+            self._queue.put_nowait((entry, None))
+        self.replayed = len(pending)
+        if pending:
+            logger.info("Replaying %d unflushed predictions via %s", len(pending), self.spill_path)
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = 30.0):
+        """
+        Flushes whatever is still queued, then stops the worker. Anything that
+        cannot be flushed in time stays in the spill file for the next start.
+        """
+        if self._worker is None:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Write-behind queue not drained on shutdown; %d predictions left in %s", self._unflushed, self.spill_path)
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+        if self._unflushed == 0:
+            for path in (self.spill_path, self.committed_path):
+                if os.path.exists(path):
+                    os.remove(path)
+        self._spill.close()  # releases the lock; leftovers are taken over on the next start
+
+    # --- producer side ---------------------------------------------------
+
+    async def enqueue(self, user_id, meeting_row: dict, prediction_row: dict) -> asyncio.Future:
+        """
+        Queues one prediction for persistence. The returned future resolves to
+        the new prediction id once the batch containing it has been committed,
+        or to None if the row had to be dead-lettered. Waits (backpressure)
+        when the queue is full; raises ValueError for a malformed row.
+        """
+        prediction_row = validate_prediction_row(prediction_row)
+        if meeting_row.get("roi") is not None and not _is_number(meeting_row["roi"]):
+            raise ValueError("roi must be a number")
+        entry = {
+            "user_id": str(user_id),
+            "meeting": meeting_row,
+            "prediction": prediction_row,
+        }
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((entry, future))
+
+        # Nothing awaits between the put and here, so the worker cannot take the
+        # entry before it has a seq and is in the spill file; a caller cancelled
+        # while waiting for room leaves no gap in the seqs either.
+        self._seq += 1
+        entry["seq"] = self._seq
+        self._unflushed += 1
+        self._spill.write(json.dumps(entry, default=str) + "\n")
+        self._spill.flush()
+        if self.fsync:
+            os.fsync(self._spill.fileno())
+
+        self.enqueued += 1
+        self.max_queue_depth = max(self.max_queue_depth, self._queue.qsize())
+        return future
+
+    # --- worker side -----------------------------------------------------
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                if not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                    continue
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            await self._flush(batch)
+
+    async def _flush(self, batch: list):
+        entries = [entry for entry, _ in batch]
+        started = time.perf_counter()
+        prediction_ids, dead = await self._write(entries, self.max_attempts)
+        if dead:
+            # Before task_done, so stop() cannot cancel the worker mid-refund
+            await self._refund_dead(entries, dead)
+
+        elapsed = time.perf_counter() - started
+        self.flushes += 1
+        self.written += len(entries) - len(dead)
+        self.last_flush_seconds = elapsed
+        self.max_flush_seconds = max(self.max_flush_seconds, elapsed)
+        self._total_flush_seconds += elapsed
+
+        # Only now is the new data visible, so cached dashboards go stale here
+        for user_id in {entry["user_id"] for entry in entries}:
+            invalidate_dashboard(user_id)
+
+        for entry, future in batch:
+            if future is not None and not future.done():
+                future.set_result(prediction_ids.get(str(entry["meeting"]["meeting_id"])))
+            self._queue.task_done()
+
+        self._unflushed -= len(batch)
+        self._mark_committed([entry["seq"] for entry in entries])
+
+    async def _write(self, entries: list, max_attempts: int) -> tuple:
+        """
+        Writes `entries`, retrying as described on the class. Returns the
+        prediction ids by meeting_id and the meeting_ids dead-lettered.
+        """
+        attempts = 0
+        backoff = 0.5
+        while True:
+            try:
+                return await asyncio.to_thread(self._write_batch, entries), set()
+            except Exception as e:
+                error = e
+            self.flush_failures += 1
+            if not is_transient_db_error(error):
+                attempts += 1
+                if attempts >= max_attempts:
+                    break
+            logger.warning("Write-behind flush of %d predictions failed, retrying in %ss: %s", len(entries), backoff, error)
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30.0)
+
+        if len(entries) == 1:
+            self._dead_letter(entries[0], error)
+            return {}, {str(entries[0]["meeting"]["meeting_id"])}
+
+        # The error comes from the rows themselves: halve until they are isolated,
+        # one attempt per half since retrying the same rows fails the same way
+        logger.warning("Write-behind flush of %d predictions keeps failing, splitting it: %s", len(entries), error)
+        middle = len(entries) // 2
+        prediction_ids, dead = {}, set()
+        for half in (entries[:middle], entries[middle:]):
+            half_ids, half_dead = await self._write(half, 1)
+            prediction_ids.update(half_ids)
+            dead |= half_dead
+        return prediction_ids, dead
+
+    def _write_batch(self, entries: list) -> dict:
+        """
+        One transaction: multi-row insert into meetings and meeting_predictions
+        plus one meeting_overview delta upsert. Rows whose meeting already
+        exists (a replay of an already-committed entry) are skipped.
+        predictions_used is not touched here; quota is reserved up front by
+        app.db.quota.
+        """
+        with SessionLocal() as session:
+            inserted = set(
+                str(meeting_id) for meeting_id in session.scalars(
+                    insert(Meeting)
+                    .values([entry["meeting"] for entry in entries])
+                    .on_conflict_do_nothing(index_elements=[Meeting.meeting_id])
+                    .returning(Meeting.meeting_id)
+                )
+            )
+            fresh = [entry for entry in entries if str(entry["meeting"]["meeting_id"]) in inserted]
+            prediction_ids = {}
+            if fresh:
+                for prediction_id, meeting_id in session.execute(
+                    insert(MeetingPrediction)
+                    .values([entry["prediction"] for entry in fresh])
+                    .returning(MeetingPrediction.id, MeetingPrediction.meeting_id)
+                ):
+                    prediction_ids[str(meeting_id)] = prediction_id
+
+                apply_overview_deltas(session, overview_deltas(fresh))
+            session.commit()
+        return prediction_ids
+
+    async def _refund_dead(self, entries: list, dead: set):
+        """Dead-lettered rows are never stored, so the quota units reserved for them go back."""
+        counts = Counter(entry["user_id"] for entry in entries if str(entry["meeting"]["meeting_id"]) in dead)
+        for user_id, count in counts.items():
+            try:
+                await refund_predictions_detached(uuid.UUID(user_id), count)
+            except Exception as e:
+                logger.error("Refund of %d dead-lettered predictions for user %s failed: %s", count, user_id, e)
+
+    def _dead_letter(self, entry: dict, error: Exception):
+        self.dead_lettered += 1
+        logger.error("Prediction for meeting %s cannot be written, moved to %s: %s",
+                     entry["meeting"]["meeting_id"], self.dead_letter_path, error)
+        line = json.dumps({**entry, "error": str(error), "failed_at": datetime.utcnow()}, default=str) + "\n"
+        # Shared by all processes: one O_APPEND write per line keeps lines whole
+        fd = os.open(self.dead_letter_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line.encode("utf-8"))
+        finally:
+            os.close(fd)
+
+    # --- spill files -----------------------------------------------------
+
+    def _spill_files(self) -> list:
+        """Spill files of every process, plus the unsuffixed one older versions wrote."""
+        directory, name = os.path.split(self.base_spill_path)
+        stem, ext = os.path.splitext(name)
+        pattern = re.compile(rf"{re.escape(stem)}\.\d+{re.escape(ext)}")
+        paths = [os.path.join(directory, f) for f in os.listdir(directory or ".") if pattern.fullmatch(f)]
+        if os.path.exists(self.base_spill_path):
+            paths.append(self.base_spill_path)
+        return sorted(paths)
+
+    @staticmethod
+    def _read_spill(path: str, f) -> list:
+        committed = 0
+        if os.path.exists(f"{path}.committed"):
+            with open(f"{path}.committed", encoding="utf-8") as marker:
+                committed = int(marker.read().strip() or 0)
+        pending = []
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # torn last line from a crash mid-write
+            if entry["seq"] > committed:
+                pending.append(entry)
+        return pending
+
+    def _take_over_spills(self) -> list:
+        """
+        Collects the unflushed entries of every spill file no live process
+        holds (including an old one under this pid), renumbers them into this
+        process's new, locked spill file and removes the old files. Returns
+        the entries to replay.
+        """
+        pending = []
+        claimed = []
+        for path in self._spill_files():
+            try:
+                f = open(path, "r", encoding="utf-8")
+            except FileNotFoundError:
+                continue  # taken over by another worker meanwhile
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                f.close()  # its process is alive
+                continue
+            pending.extend(self._read_spill(path, f))
+            claimed.append((path, f))
+
+        for seq, entry in enumerate(pending, 1):
+            entry["seq"] = seq
+        # Locked before it takes the final name, so no other worker can claim it
+        tmp_path = f"{self.spill_path}.tmp"
+        self._spill = open(tmp_path, "w", encoding="utf-8")
+        fcntl.flock(self._spill, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        for entry in pending:
+            self._spill.write(json.dumps(entry, default=str) + "\n")
+        self._spill.flush()
+        os.fsync(self._spill.fileno())
+        if os.path.exists(self.committed_path):
+            os.remove(self.committed_path)
+        os.replace(tmp_path, self.spill_path)
+
+        # A crash before this point replays entries twice, which is harmless
+        for path, f in claimed:
+            if path != self.spill_path:
+                os.remove(path)
+                if os.path.exists(f"{path}.committed"):
+                    os.remove(f"{path}.committed")
+            f.close()
+        if claimed:
+            logger.info("Took over %d spill files", len(claimed))
+        return pending
+
+    def _mark_committed(self, seqs: list):
+        """
+        Advances the committed marker to the highest seq below which every
+        entry is in the DB (or dead-lettered); batches need not finish in seq order.
+        """
+        self._done_seqs.update(seqs)
+        while self._committed_seq + 1 in self._done_seqs:
+            self._committed_seq += 1
+            self._done_seqs.remove(self._committed_seq)
+        if self._unflushed == 0:
+            # Everything accepted so far is in the DB; start a fresh spill file
+            self._spill.truncate(0)
+            self._spill.seek(0)
+        with open(self.committed_path, "w", encoding="utf-8") as f:
+            f.write(str(self._committed_seq))
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "max_queue_depth": self.max_queue_depth,
+            "queue_capacity": self._queue.maxsize if self._queue else self._queue_size,
+            "unflushed": self._unflushed,
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "replayed": self.replayed,
+            "flushes": self.flushes,
+            "flush_failures": self.flush_failures,
+            "dead_lettered": self.dead_lettered,
+            "committed_seq": self._committed_seq,
+            "last_flush_seconds": round(self.last_flush_seconds, 4),
+            "max_flush_seconds": round(self.max_flush_seconds, 4),
+            "avg_flush_seconds": round(self._total_flush_seconds / self.flushes, 4) if self.flushes else 0.0,
+            "avg_batch_size": round(self.written / self.flushes, 2) if self.flushes else 0.0,
+        }
+
+
+prediction_writer = PredictionWriter(
+    spill_path=settings.WRITE_BEHIND_SPILL_PATH,
+    queue_size=settings.WRITE_BEHIND_QUEUE_SIZE,
+    batch_size=settings.WRITE_BEHIND_BATCH_SIZE,
+    flush_interval=settings.WRITE_BEHIND_FLUSH_INTERVAL,
+    fsync=settings.WRITE_BEHIND_FSYNC,
+    max_attempts=settings.WRITE_BEHIND_MAX_ATTEMPTS,
+)
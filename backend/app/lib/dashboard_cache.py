@@ -0,0 +1,15 @@
+from app.core.config import settings
+from app.lib.ttl_cache import TTLCache
+
+# DashboardResponse per user_id. Entries are dropped when that user gets a
+# new prediction or a plan change; the TTL bounds staleness across workers,
+# which do not see each other's invalidations.
+dashboard_cache = TTLCache(
+    maxsize=settings.DASHBOARD_CACHE_MAX_ENTRIES,
+    ttl=settings.DASHBOARD_CACHE_TTL_SECONDS,
+    name="dashboard",
+)
+
+
+def invalidate_dashboard(user_id):
+    dashboard_cache.pop(str(user_id))
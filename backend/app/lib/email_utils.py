@@ -1,25 +1,26 @@
-import smtplib
+import logging
 from email.message import EmailMessage
 from typing import Dict
 from app.core.config import settings
 from dotenv import load_dotenv
 from app.lib.generate_email_html import _generate_email_html
+from app.lib.mail_transport import mail_transport
 
 load_dotenv()  # Load variables from .env
 
-SMTP_SERVER = "smtp.gmail.com"
-SMTP_PORT = 587
+logger = logging.getLogger(__name__)
+
 FRONTEND_VERIFY_URL = f"{settings.FRONTEND_URL}/isverified?token="  # Your React frontend route
 PASSWORD_RESET_URL = f"{settings.FRONTEND_URL}/reset-password?token="
 
 
-def send_verification_email(to_email: str, token: str):
+async def send_verification_email(to_email: str, token: str):
     """
-    Sends an email verification link to the user.
+    Queues an email verification link to the user.
     """
     msg = EmailMessage()
     msg["Subject"] = "Verify Your MeetingROI Account"
-    msg["From"] = "norrepl@mycompany.com"
+    msg["From"] = settings.MAIL_FROM
     msg["To"] = to_email
 
     verify_link = FRONTEND_VERIFY_URL + token
@@ -34,23 +35,17 @@ def send_verification_email(to_email: str, token: str):
     )
     msg.add_alternative(html_body, subtype="html")
 
-    try:
-        with smtplib.SMTP(SMTP_SERVER, SMTP_PORT) as server:
-            server.starttls()  # Secure the connection
-            server.login(settings.SMTP_USER, settings.SMTP_PASS)
-            server.send_message(msg)
-            print(f"Verification email sent to {to_email}!")
-    except Exception as e:
-        print(f"Error sending verification email to {to_email}:", e)
-        raise # Re-raise the exception for upstream error handling
+    # Delivered in the background over a pooled SMTP connection
+    await mail_transport.enqueue(msg)
+    logger.debug("Verification email queued for %s", to_email)
 
-def send_reset_pass(to_email: str, token: str):
+async def send_reset_pass(to_email: str, token: str):
     """
-    Sends a password reset link to the user.
+    Queues a password reset link to the user.
     """
     msg = EmailMessage()
     msg["Subject"] = "Reset Your MeetingROI Password"
-    msg["From"] = "norrepl@mycompany.com"
+    msg["From"] = settings.MAIL_FROM
     msg["To"] = to_email
 
     reset_link = PASSWORD_RESET_URL + token
@@ -65,12 +60,6 @@ def send_reset_pass(to_email: str, token: str):
     )
     msg.add_alternative(html_body, subtype="html")
 
-    try:
-        with smtplib.SMTP(SMTP_SERVER, SMTP_PORT) as server:
-            server.starttls()  # Secure the connection
-            server.login(settings.SMTP_USER, settings.SMTP_PASS)
-            server.send_message(msg)
-            print(f"Password reset email sent to {to_email}!")
-    except Exception as e:
-        print(f"Error sending password reset email to {to_email}:", e)
-        raise # Re-raise the exception for upstream error handling
\ No newline at end of file
+    # Delivered in the background over a pooled SMTP connection
+    await mail_transport.enqueue(msg)
+    logger.debug("Password reset email queued for %s", to_email)
@@ -0,0 +1,43 @@
+import re
+
+# A top-level scalar is complete once the token after its value has arrived
+_SCALAR_FIELD = re.compile(
+    r'"(?P<name>[A-Za-z_][A-Za-z0-9_]*)"\s*:\s*'
+    r'(?P<value>true|false|null|-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?)\s*[,}\n]'
+)
+
+
+class StreamingFieldScanner:
+    """
+    Picks completed scalar fields out of a JSON object while it is still
+    being generated, so they can be forwarded before the document closes.
+    """
+
+    def __init__(self, fields):
+        self.fields = set(fields)
+        self.buffer = ""
+        self.emitted = set()
+        self._scan_from = 0
+
+    def feed(self, chunk: str) -> list[tuple[str, object]]:
+        self.buffer += chunk
+        found = []
+        for match in _SCALAR_FIELD.finditer(self.buffer, self._scan_from):
+            name = match.group("name")
+            if name in self.fields and name not in self.emitted:
+                self.emitted.add(name)
+                found.append((name, _parse_scalar(match.group("value"))))
+            self._scan_from = match.end() - 1
+        return found
+
+
+def _parse_scalar(raw: str):
+    if raw == "true":
+        return True
+    if raw == "false":
+        return False
+    if raw == "null":
+        return None
+    if any(c in raw for c in ".eE"):
+        return float(raw)
+    return int(raw)
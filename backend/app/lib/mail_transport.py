@@ -0,0 +1,186 @@
+import asyncio
+import logging
+import time
+from email.message import EmailMessage
+from typing import Optional
+import aiosmtplib
+from app.core.config import settings
+from app.core.metrics import SMTP_SEND_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+def is_permanent_failure(error: Exception) -> bool:
+    """5xx replies and refused recipients will fail the same way on every retry."""
+    if isinstance(error, aiosmtplib.SMTPRecipientsRefused):
+        return True
+    return isinstance(error, aiosmtplib.SMTPResponseException) and 500 <= error.code < 600
+
+
+class MailTransport:
+    """
+    Async SMTP delivery over a small pool of reused connections.
+
+    Callers enqueue EmailMessages and return at once. pool_size worker tasks
+    drain the bounded queue; each owns one SMTP connection that is opened
+    (STARTTLS and login included) on first use and kept for later messages.
+    A failed send drops that connection and is retried with exponential
+    backoff; permanent (5xx) failures are not retried. Login is skipped when
+    no username is configured, so a local debug server works as-is.
+    """
+
+    def __init__(self, hostname: str, port: int, username: str = "", password: str = "",
+                 start_tls: bool = True, use_tls: bool = False, timeout: float = 30.0,
+                 pool_size: int = 2, queue_size: int = 1000,
+                 max_retries: int = 5, retry_backoff: float = 1.0):
+        self.hostname = hostname
+        self.port = port
+        self.username = username
+        self.password = password
+        self.start_tls = start_tls
+        self.use_tls = use_tls
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self._queue: Optional[asyncio.Queue] = None
+        self._queue_size = queue_size
+        self._workers: list = []
+
+        # Metrics
+        self.enqueued = 0
+        self.sent = 0
+        self.failed = 0
+        self.retries = 0
+        self.connections_opened = 0
+        self.max_queue_depth = 0
+        self._total_send_seconds = 0.0
+
+    # --- lifecycle -------------------------------------------------------
+
+    async def start(self):
+        self._queue = asyncio.Queue(maxsize=self._queue_size)
+        self._workers = [asyncio.create_task(self._run()) for _ in range(self.pool_size)]
+
+    async def stop(self, timeout: float = 30.0):
+        """Delivers what is still queued (up to timeout), then closes the connections."""
+        if not self._workers:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Mail queue not drained on shutdown; %d emails dropped", self._queue.qsize())
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def join(self):
+        """Waits until every queued message has been sent or given up on."""
+        await self._queue.join()
+
+    # --- producer side ---------------------------------------------------
+
+    async def enqueue(self, message: EmailMessage):
+        """Queues one message for delivery. Waits (backpressure) when the queue is full."""
+        if not self._workers:
+            raise RuntimeError("MailTransport is not started")
+        await self._queue.put(message)
+        self.enqueued += 1
+        self.max_queue_depth = max(self.max_queue_depth, self._queue.qsize())
+
+    # --- worker side -----------------------------------------------------
+
+    def _new_connection(self) -> aiosmtplib.SMTP:
+        return aiosmtplib.SMTP(
+            hostname=self.hostname,
+            port=self.port,
+            username=self.username or None,
+            password=self.password or None,
+            use_tls=self.use_tls,
+            start_tls=self.start_tls,
+            timeout=self.timeout,
+        )
+
+    async def _run(self):
+        smtp = None
+        try:
+            while True:
+                message = await self._queue.get()
+                try:
+                    smtp = await self._deliver(smtp, message)
+                finally:
+                    self._queue.task_done()
+        finally:
+            if smtp is not None and smtp.is_connected:
+                try:
+                    await smtp.quit()
+                except Exception:
+                    smtp.close()
+
+    async def _deliver(self, smtp: Optional[aiosmtplib.SMTP], message: EmailMessage) -> Optional[aiosmtplib.SMTP]:
+        """Sends one message, reconnecting and retrying as needed. Returns the connection to keep."""
+        backoff = self.retry_backoff
+        for attempt in range(self.max_retries + 1):
+            started = time.perf_counter()
+            try:
+                if smtp is None or not smtp.is_connected:
+                    smtp = self._new_connection()
+                    # connect() also runs STARTTLS and login when configured
+                    await smtp.connect()
+                    self.connections_opened += 1
+                await smtp.send_message(message)
+                self.sent += 1
+                elapsed = time.perf_counter() - started
+                self._total_send_seconds += elapsed
+                SMTP_SEND_SECONDS.labels("sent").observe(elapsed)
+                return smtp
+            except Exception as e:
+                SMTP_SEND_SECONDS.labels("error").observe(time.perf_counter() - started)
+                if smtp is not None:
+                    smtp.close()
+                    smtp = None
+                if is_permanent_failure(e) or attempt == self.max_retries:
+                    self.failed += 1
+                    logger.error("Giving up on email to %s after %d attempts: %s", message["To"], attempt + 1, e)
+                    return smtp
+                self.retries += 1
+                logger.warning("Email to %s failed, retrying in %ss: %s", message["To"], backoff, e)
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 60.0)
+        return smtp
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "max_queue_depth": self.max_queue_depth,
+            "queue_capacity": self._queue_size,
+            "pool_size": self.pool_size,
+            "enqueued": self.enqueued,
+            "sent": self.sent,
+            "failed": self.failed,
+            "retries": self.retries,
+            "connections_opened": self.connections_opened,
+            "avg_send_seconds": round(self._total_send_seconds / self.sent, 4) if self.sent else 0.0,
+        }
+
+
+def mail_transport_from_settings(**overrides) -> MailTransport:
+    options = dict(
+        hostname=settings.SMTP_HOST,
+        port=settings.SMTP_PORT,
+        username=settings.SMTP_USER,
+        password=settings.SMTP_PASS,
+        start_tls=settings.SMTP_STARTTLS,
+        use_tls=settings.SMTP_USE_TLS,
+        timeout=settings.SMTP_TIMEOUT,
+        pool_size=settings.SMTP_POOL_SIZE,
+        queue_size=settings.SMTP_QUEUE_SIZE,
+        max_retries=settings.SMTP_MAX_RETRIES,
+        retry_backoff=settings.SMTP_RETRY_BACKOFF,
+    )
+    options.update(overrides)
+    return MailTransport(**options)
+
+
+mail_transport = mail_transport_from_settings()
@@ -0,0 +1,148 @@
+import asyncio
+import json
+import logging
+import time
+import httpx
+from typing import AsyncIterator, Optional
+from app.core.config import settings
+from app.core.metrics import GPT_REQUEST_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# One pooled client per worker process. It is opened by the FastAPI lifespan
+# hook so every prediction reuses warm keep-alive connections instead of paying
+# DNS + TCP + TLS on each call.
+_client: Optional[httpx.AsyncClient] = None
+
+
+def _build_client() -> httpx.AsyncClient:
+    limits = httpx.Limits(
+        max_connections=settings.OPENAI_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=settings.OPENAI_KEEPALIVE_EXPIRY,
+    )
+    timeout = httpx.Timeout(
+        connect=settings.OPENAI_CONNECT_TIMEOUT,
+        read=settings.OPENAI_READ_TIMEOUT,
+        write=settings.OPENAI_CONNECT_TIMEOUT,
+        pool=settings.OPENAI_CONNECT_TIMEOUT,
+    )
+    return httpx.AsyncClient(
+        http2=settings.OPENAI_HTTP2,
+        limits=limits,
+        timeout=timeout,
+        headers={
+            "Authorization": f"Bearer {settings.OPENAI_API_KEY}",
+            "Content-Type": "application/json"
+        },
+    )
+
+
+async def init_openai_client() -> httpx.AsyncClient:
+    """
+    Creates the shared OpenAI client. Called once on application startup.
+    """
+    global _client
+    if _client is None:
+        _client = _build_client()
+    return _client
+
+
+async def close_openai_client():
+    """
+    Closes the shared OpenAI client and its pooled connections on shutdown.
+    """
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def get_openai_client() -> httpx.AsyncClient:
+    """
+    Returns the shared client, creating it lazily when the lifespan hook
+    has not run (e.g. scripts or tests that call the helpers directly).
+    """
+    global _client
+    if _client is None:
+        _client = _build_client()
+    return _client
+
+
+def _failure_outcome(error: BaseException) -> str:
+    if isinstance(error, (asyncio.CancelledError, GeneratorExit)):
+        return "cancelled"
+    if isinstance(error, httpx.TimeoutException):
+        return "timeout"
+    if isinstance(error, httpx.HTTPStatusError):
+        return f"http_{error.response.status_code // 100}xx"
+    return "error"
+
+
+async def get_gpt_response(model: str, prompt: str) -> str:
+    payload = {
+        "model": model,
+        "messages": [
+            {"role": "system", "content": "You are an AI that returns ONLY valid JSON."},
+            {"role": "user", "content": prompt}
+        ],
+    }
+
+    client = get_openai_client()
+    started = time.perf_counter()
+    outcome = "ok"
+    try:
+        response = await client.post(settings.OPENAI_API_URL, json=payload)
+        if response.status_code != 200:
+            logger.error("OpenAI API error %s for %s: %.500s", response.status_code, model, response.text)
+            response.raise_for_status()
+        data = response.json()
+        return data["choices"][0]["message"]["content"].strip()
+    except BaseException as e:
+        outcome = _failure_outcome(e)
+        raise
+    finally:
+        GPT_REQUEST_SECONDS.labels(model, outcome).observe(time.perf_counter() - started)
+
+
+async def stream_gpt_response(model: str, prompt: str) -> AsyncIterator[str]:
+    """
+    Yields content deltas as the completion is generated (provider streaming mode).
+    """
+    payload = {
+        "model": model,
+        "messages": [
+            {"role": "system", "content": "You are an AI that returns ONLY valid JSON."},
+            {"role": "user", "content": prompt}
+        ],
+        "stream": True,
+    }
+
+    client = get_openai_client()
+    # Timed until the last delta, so this is the full generation time
+    started = time.perf_counter()
+    outcome = "ok"
+    try:
+        async with client.stream("POST", settings.OPENAI_API_URL, json=payload) as response:
+            if response.status_code != 200:
+                await response.aread()
+                logger.error("OpenAI API error %s for %s: %.500s", response.status_code, model, response.text)
+                response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                chunk = json.loads(data)
+                choices = chunk.get("choices") or []
+                if not choices:
+                    continue
+                delta = choices[0].get("delta", {}).get("content")
+                if delta:
+                    yield delta
+    except BaseException as e:
+        outcome = _failure_outcome(e)
+        raise
+    finally:
+        GPT_REQUEST_SECONDS.labels(model, outcome).observe(time.perf_counter() - started)
@@ -0,0 +1,235 @@
+"""
+Offline ingestion of exported Paddle events (one webhook payload per line).
+
+The file is streamed once and only the latest state of each subscription
+is kept (by occurred_at, file order breaking ties), together with what
+that final event means for its user. Everything is then written in large
+transactions: one executemany subscription upsert plus one batched users
+update per --batch-size subscriptions. Subscriptions whose live webhook
+history is already newer than the export are left alone. With
+--record-events the file is read a second time once those writes have
+committed, storing the raw events as processed.
+
+    cd backend
+    python -m app.lib.paddle_backfill events.jsonl --batch-size 2000 [--record-events]
+"""
+import argparse
+import json
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Iterable, Iterator
+from sqlalchemy import func, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from app.api.routes.paddle_webhook import (
+    SUBSCRIPTION_EVENTS,
+    SUBSCRIPTION_UPSERT,
+    extract_subscription_details,
+    subscription_upsert_rows,
+    subscription_user_values,
+)
+from app.db.database import SessionLocal
+from app.db.models import PaddleEvent, Subscription, User
+from app.db.paddle_events import event_subscription_id, parse_paddle_timestamp
+from app.core.logging_config import setup_logging, shutdown_logging
+from app.db.plan_catalog import plan_catalog
+
+logger = logging.getLogger(__name__)
+
+EPOCH = datetime.min.replace(tzinfo=timezone.utc)
+
+
+def iter_events(path: str) -> Iterator[dict]:
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                logger.warning("Skipping line %d: %s", line_number, e)
+
+
+def chunks(items: Iterable, size: int) -> Iterator[list]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def record_events(session: Session, events: list):
+    """Store raw events as already processed so live redeliveries are recognised as duplicates."""
+    now = datetime.now(timezone.utc)
+    rows = []
+    for data in events:
+        if not data.get("event_id"):
+            continue
+        rows.append({
+            "event_id": data["event_id"],
+            "event_type": data.get("event_type") or "unknown",
+            "subscription_id": event_subscription_id(data),
+            "occurred_at": parse_paddle_timestamp(data.get("occurred_at")) or datetime.now(timezone.utc),
+            "payload": data,
+            "processed_at": now,
+        })
+    if rows:
+        # Plain parameter rows (no per-row SQL) so SQLAlchemy batches them as insertmanyvalues
+        session.execute(insert(PaddleEvent).on_conflict_do_nothing(index_elements=[PaddleEvent.event_id]), rows)
+        session.commit()
+
+
+class LatestState:
+    """Final subscription row and user effect per subscription, folded over the stream."""
+
+    def __init__(self):
+        self.by_subscription = {}  # paddle_subscription_id -> (occurred_at, order, event_type, details)
+        self.read = 0
+        self.applied = 0
+        self.ignored = 0
+        self._order = 0
+
+    def add(self, data: dict):
+        self.read += 1
+        event_type = data.get("event_type")
+        event_data = data.get("data") or {}
+        if event_type not in SUBSCRIPTION_EVENTS or not event_data.get("id"):
+            self.ignored += 1
+            return
+        self.applied += 1
+        self._order += 1
+        occurred_at = parse_paddle_timestamp(data.get("occurred_at")) or EPOCH
+        current = self.by_subscription.get(event_data["id"])
+        if current is not None and (current[0], current[1]) > (occurred_at, self._order):
+            return
+        user_id = (event_data.get("custom_data") or {}).get("user_id")
+        details = extract_subscription_details(event_data, user_id)
+        self.by_subscription[event_data["id"]] = (occurred_at, self._order, event_type, details)
+
+
+def newer_live_subscriptions(session: Session, latest: dict) -> set:
+    """Subscriptions whose processed webhook history is newer than the exported state."""
+    rows = session.execute(
+        select(PaddleEvent.subscription_id, func.max(PaddleEvent.occurred_at))
+        .where(
+            PaddleEvent.subscription_id.in_(list(latest)),
+            PaddleEvent.processed_at.is_not(None),
+            PaddleEvent.last_error.is_(None),
+            PaddleEvent.event_type.like("subscription.%"),
+        )
+        .group_by(PaddleEvent.subscription_id)
+    )
+    return {subscription_id for subscription_id, occurred_at in rows if occurred_at > latest[subscription_id][0]}
+
+
+def write_batch(session: Session, batch: list) -> tuple:
+    """One transaction for a batch of (occurred_at, order, event_type, details). Returns (subscriptions, users) written."""
+    latest = {details["paddle_subscription_id"]: (occurred_at, order, event_type, details)
+              for occurred_at, order, event_type, details in batch}
+    for subscription_id in newer_live_subscriptions(session, latest):
+        del latest[subscription_id]
+
+    # Events without custom_data fall back to the user already on the subscription
+    missing = [sid for sid, entry in latest.items() if not entry[3]["user_id"]]
+    if missing:
+        known = dict(session.execute(
+            select(Subscription.paddle_subscription_id, Subscription.user_id)
+            .where(Subscription.paddle_subscription_id.in_(missing))
+        ).all())
+        for subscription_id in missing:
+            if subscription_id in known:
+                latest[subscription_id][3]["user_id"] = str(known[subscription_id])
+            else:
+                del latest[subscription_id]
+    if not latest:
+        return 0, 0
+
+    # The user follows whichever of their subscriptions changed last
+    user_updates = {}
+    for occurred_at, order, event_type, details in sorted(latest.values(), key=lambda entry: entry[:2]):
+        values = subscription_user_values(event_type, details)
+        if values is not None:
+            user_updates[details["user_id"]] = {"id": details["user_id"], **values}
+
+    session.execute(SUBSCRIPTION_UPSERT, subscription_upsert_rows([entry[3] for entry in latest.values()]))
+    # Grouped by column set so each group is a single executemany UPDATE
+    groups = {}
+    for row in user_updates.values():
+        groups.setdefault(tuple(sorted(row)), []).append(row)
+    for rows in groups.values():
+        session.execute(update(User), rows)
+    session.commit()
+    return len(latest), len(user_updates)
+
+
+def run_backfill(path: str, batch_size: int = 2000, record: bool = False, dry_run: bool = False) -> dict:
+    started = time.perf_counter()
+    state = LatestState()
+
+    with SessionLocal() as session:
+        plan_catalog.load_sync(session)
+
+        # 1️⃣ Stream the file, keeping only the latest state per subscription
+        for data in iter_events(path):
+            state.add(data)
+            if state.read % 10000 == 0:
+                elapsed = time.perf_counter() - started
+                logger.info("%d events read, %d subscriptions, %.0f events/s", state.read, len(state.by_subscription), state.read / elapsed)
+        read_seconds = time.perf_counter() - started
+        logger.info("%d events read in %.1fs: %d subscriptions, %d other events ignored",
+                    state.read, read_seconds, len(state.by_subscription), state.ignored)
+
+        # 2️⃣ Write subscriptions and users in large transactions
+        subscriptions = users = 0
+        entries = sorted(state.by_subscription.values(), key=lambda entry: entry[:2])
+        if not dry_run:
+            for batch in chunks(entries, batch_size):
+                written_subscriptions, written_users = write_batch(session, batch)
+                subscriptions += written_subscriptions
+                users += written_users
+                elapsed = time.perf_counter() - started
+                logger.info("%d subscriptions, %d users written (%.0f events/s overall)", subscriptions, users, state.read / elapsed)
+
+        # 3️⃣ Only now mark the events processed: if the run dies before the writes
+        # commit, nothing is recorded and live redeliveries are still applied
+        recorded = 0
+        if record and not dry_run:
+            for events in chunks(iter_events(path), batch_size):
+                record_events(session, events)
+                recorded += len(events)
+            logger.info("%d events recorded as processed", recorded)
+
+    elapsed = time.perf_counter() - started
+    report = {
+        "events": state.read,
+        "subscription_events": state.applied,
+        "ignored_events": state.ignored,
+        "subscriptions": len(state.by_subscription),
+        "subscriptions_written": subscriptions,
+        "users_updated": users,
+        "events_recorded": recorded,
+        "seconds": round(elapsed, 2),
+        "events_per_second": round(state.read / elapsed, 1) if elapsed else 0.0,
+    }
+    logger.info("Backfill done: %s", report)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", help="JSONL file, one Paddle webhook payload per line")
+    parser.add_argument("--batch-size", type=int, default=2000, help="subscriptions per transaction")
+    parser.add_argument("--record-events", action="store_true",
+                        help="also store the raw events in paddle_events, marked processed")
+    parser.add_argument("--dry-run", action="store_true", help="read and fold the file without writing")
+    args = parser.parse_args()
+    setup_logging()
+    try:
+        run_backfill(args.path, batch_size=args.batch_size, record=args.record_events, dry_run=args.dry_run)
+    finally:
+        shutdown_logging()
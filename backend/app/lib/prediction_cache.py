@@ -0,0 +1,162 @@
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from typing import Optional
+from pydantic import BaseModel
+from app.core.config import settings
+from app.core.metrics import CACHE_LOOKUPS
+from app.lib.ttl_cache import TTLCache
+
+_prediction_hits = CACHE_LOOKUPS.labels("prediction", "hit")
+_prediction_misses = CACHE_LOOKUPS.labels("prediction", "miss")
+
+
+def _normalize(value):
+    # Collapse whitespace so cosmetic edits to a recurring meeting still hit
+    if isinstance(value, str):
+        return " ".join(value.split())
+    return value
+
+
+def make_prediction_cache_key(meeting_data: BaseModel, model: str, token_budget: Optional[int] = None) -> str:
+    """
+    Canonical content hash of a meeting payload plus the model that scores it
+    and the prompt token budget (a smaller budget sends a condensed prompt).
+    """
+    normalized = {k: _normalize(v) for k, v in meeting_data.model_dump().items()}
+    canonical = json.dumps(
+        {"model": model, "token_budget": token_budget, "meeting": normalized},
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class SQLitePredictionStore:
+    """
+    Persistent second tier so cached predictions survive restarts.
+    """
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS prediction_cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[tuple[dict, float]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM prediction_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, expires_at = row
+            if expires_at <= time.time():
+                self._conn.execute("DELETE FROM prediction_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+        return json.loads(value), expires_at - time.time()
+
+    def set(self, key: str, value: dict, ttl: float):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO prediction_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), time.time() + ttl),
+            )
+            self._conn.commit()
+
+    def prune(self, max_entries: int):
+        # Drop expired rows, then the oldest-expiring rows beyond the size bound
+        with self._lock:
+            self._conn.execute("DELETE FROM prediction_cache WHERE expires_at <= ?", (time.time(),))
+            self._conn.execute(
+                """
+                DELETE FROM prediction_cache WHERE key IN (
+                    SELECT key FROM prediction_cache
+                    ORDER BY expires_at DESC LIMIT -1 OFFSET ?
+                )
+                """,
+                (max_entries,),
+            )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class PredictionCache:
+    """
+    In-memory TTL + LRU cache of parsed GPT predictions, optionally backed by
+    SQLite. Memory is checked first; persistent hits are promoted into memory.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, sqlite_path: Optional[str] = None):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._memory = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._store = SQLitePredictionStore(sqlite_path) if sqlite_path else None
+        self.persistent_hits = 0
+        self._writes_since_prune = 0
+
+    async def get(self, key: str) -> Optional[dict]:
+        value = self._memory.get(key)
+        if value is None and self._store is not None:
+            found = await asyncio.to_thread(self._store.get, key)
+            if found is not None:
+                value, remaining_ttl = found
+                self.persistent_hits += 1
+                self._memory.set(key, value, ttl=remaining_ttl)
+        # Counted here rather than by the memory cache: a SQLite hit is a hit
+        (_prediction_misses if value is None else _prediction_hits).inc()
+        return value
+
+    async def set(self, key: str, value: dict):
+        self._memory.set(key, value)
+        if self._store is None:
+            return
+        await asyncio.to_thread(self._store.set, key, value, self.ttl)
+        self._writes_since_prune += 1
+        if self._writes_since_prune >= 1000:
+            self._writes_since_prune = 0
+            await asyncio.to_thread(self._store.prune, self.maxsize * 10)
+
+    def close(self):
+        if self._store is not None:
+            self._store.close()
+
+    def stats(self) -> dict:
+        stats = self._memory.stats()
+        stats["persistent"] = self._store is not None
+        stats["persistent_hits"] = self.persistent_hits
+        # A memory miss answered from SQLite is still a cache hit overall
+        stats["hits"] += self.persistent_hits
+        stats["misses"] -= self.persistent_hits
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        return stats
+
+
+prediction_cache: Optional[PredictionCache] = (
+    PredictionCache(
+        maxsize=settings.PREDICTION_CACHE_MAX_ENTRIES,
+        ttl=settings.PREDICTION_CACHE_TTL_SECONDS,
+        sqlite_path=settings.PREDICTION_CACHE_SQLITE_PATH or None,
+    )
+    if settings.PREDICTION_CACHE_ENABLED
+    else None
+)
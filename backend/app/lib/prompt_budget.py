@@ -0,0 +1,247 @@
+"""
+Keeps prediction prompts inside a per-plan input token budget.
+
+Tokens are counted locally with tiktoken. Its BPE file is downloaded on
+first use, which warm_encodings() does off the event loop at startup;
+until an encoding is loaded (or when the download fails, in which case
+it is retried in the background) a ~4 characters per token estimate is
+used. When notes or agenda text do not fit, they are condensed
+deterministically, stopping at the first step that fits: repeated lines
+are dropped; prose paragraphs are shortened, then cut to their first
+sentence, then left out so only section headers and bullets remain;
+bullets are shortened; finally the outline is trimmed to the budget.
+Condensed text is cached by content hash, so a recurring agenda is
+processed once.
+"""
+import asyncio
+import hashlib
+import logging
+import math
+import re
+import threading
+import time
+from typing import Iterable, Optional
+import tiktoken
+from app.core.config import settings
+from app.core.metrics import PROMPT_TOKENS
+from app.lib.ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Smallest share a non-empty section is squeezed to, whatever the budget
+MIN_SECTION_TOKENS = 64
+# Wait before another background attempt to load an encoding that failed
+ENCODING_RETRY_SECONDS = 300.0
+
+HEADER_RE = re.compile(
+    r"^(#{1,6}\s+\S.*"                          # markdown heading
+    r"|(\d+(\.\d+)*[.)]?\s+)?[A-Z][^.!?]{0,80}:"  # "Budget review:" / "2. Risks:"
+    r"|[A-Z0-9][A-Z0-9 &/\-]{2,60})$"            # ALL CAPS line
+)
+BULLET_RE = re.compile(r"^([-*•·▪●◦]|\d+[.)]|[a-zA-Z][.)]|\[[ xX]\])\s+")
+SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s")
+
+condensed_cache = TTLCache(
+    maxsize=settings.PROMPT_CONDENSE_CACHE_MAX_ENTRIES,
+    ttl=settings.PROMPT_CONDENSE_CACHE_TTL_SECONDS,
+    name="prompt_condense",
+)
+
+
+def parse_budgets(spec: str) -> dict:
+    """ "free=1500, pro=4000" -> {"free": 1500, "pro": 4000} """
+    budgets = {}
+    for item in spec.split(","):
+        if "=" not in item:
+            continue
+        name, value = item.split("=", 1)
+        budgets[name.strip().lower()] = int(value)
+    return budgets
+
+
+PLAN_TOKEN_BUDGETS = parse_budgets(settings.PROMPT_TOKEN_BUDGETS)
+
+
+def plan_token_budget(plan_name: str) -> Optional[int]:
+    """Input token budget of a plan; None (or 0 in settings) means unlimited."""
+    budget = PLAN_TOKEN_BUDGETS.get(plan_name.lower(), settings.PROMPT_TOKEN_BUDGET_DEFAULT)
+    return budget or None
+
+
+# --- counting ------------------------------------------------------------
+
+_encodings = {}  # model -> tiktoken.Encoding, only successful loads
+_load_attempted = {}  # model -> time.monotonic() of the last load attempt
+_load_lock = threading.Lock()
+
+
+def load_encoding(model: str) -> Optional["tiktoken.Encoding"]:
+    """Blocking (may download the BPE file); keep it off the event loop. Failures are not cached."""
+    with _load_lock:
+        if model in _encodings:
+            return _encodings[model]
+        _load_attempted[model] = time.monotonic()
+        try:
+            try:
+                encoding = tiktoken.encoding_for_model(model)
+            except KeyError:
+                encoding = tiktoken.get_encoding("o200k_base")
+        except Exception as e:
+            logger.warning("tiktoken encoding for %s unavailable, estimating tokens: %s", model, e)
+            return None
+        _encodings[model] = encoding
+        return encoding
+
+
+async def warm_encodings(models: Iterable[str]):
+    """Loads the encodings of `models` on a worker thread; called once from the app lifespan."""
+    for model in models:
+        await asyncio.to_thread(load_encoding, model)
+
+
+def _encoding(model: str):
+    encoding = _encodings.get(model)
+    if encoding is None and time.monotonic() - _load_attempted.get(model, -math.inf) > ENCODING_RETRY_SECONDS:
+        # Never download on the caller's thread, which is usually the event loop
+        _load_attempted[model] = time.monotonic()
+        threading.Thread(target=load_encoding, args=(model,), daemon=True).start()
+    return encoding
+
+
+def tokenizer_name(model: str) -> str:
+    encoding = _encoding(model)
+    return encoding.name if encoding is not None else "estimate"
+
+
+def count_tokens(text: str, model: str) -> int:
+    if not text:
+        return 0
+    encoding = _encoding(model)
+    if encoding is None:
+        return math.ceil(len(text) / 4)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+# --- condensing ----------------------------------------------------------
+
+def _unique_lines(text: str) -> list:
+    """Non-blank lines, whitespace collapsed, repeats (ignoring case) dropped."""
+    seen = set()
+    lines = []
+    for raw in text.splitlines():
+        line = " ".join(raw.split())
+        key = line.lower()
+        if not line or key in seen:
+            continue
+        seen.add(key)
+        lines.append(line)
+    return lines
+
+
+def _shorten(line: str, limit: int) -> str:
+    return line if len(line) <= limit else line[:limit - 1].rstrip() + "…"
+
+
+def _outline(lines: list, prose: Optional[str], line_chars: int) -> list:
+    """Headers and bullets, with prose lines kept whole ("full"), as their first sentence ("first") or not at all."""
+    kept = []
+    for line in lines:
+        if HEADER_RE.match(line):
+            kept.append(line)
+        elif BULLET_RE.match(line):
+            kept.append(_shorten(line, line_chars))
+        elif prose == "full":
+            kept.append(_shorten(line, line_chars))
+        elif prose == "first":
+            kept.append(_shorten(SENTENCE_END_RE.split(line, 1)[0], line_chars))
+    return kept
+
+
+def _trim(lines: list, max_tokens: int, model: str) -> str:
+    kept = []
+    used = 0
+    for index, line in enumerate(lines):
+        cost = count_tokens(line, model) + 1
+        if used + cost > max_tokens - 16:  # room for the omission marker
+            kept.append(f"[… {len(lines) - index} more lines omitted]")
+            break
+        kept.append(line)
+        used += cost
+    return "\n".join(kept)
+
+
+def condense_text(text: str, max_tokens: int, model: str) -> str:
+    """`text` cut down to about max_tokens. Same input, same output; cached by content hash."""
+    if count_tokens(text, model) <= max_tokens:
+        return text
+    key = (hashlib.sha256(text.encode("utf-8")).hexdigest(), max_tokens, model)
+    cached = condensed_cache.get(key)
+    if cached is not None:
+        return cached
+
+    lines = _unique_lines(text)
+    candidates = (
+        lines,
+        _outline(lines, prose="full", line_chars=400),
+        _outline(lines, prose="first", line_chars=240),
+        _outline(lines, prose=None, line_chars=240),
+        _outline(lines, prose=None, line_chars=100),
+    )
+    condensed = None
+    for candidate in candidates:
+        joined = "\n".join(candidate)
+        if candidate and count_tokens(joined, model) <= max_tokens:
+            condensed = joined
+            break
+    if condensed is None:
+        # Outline still too long (or nothing outline-like): keep what fits of it
+        condensed = _trim(candidates[-1] or candidates[2], max_tokens, model)
+
+    condensed_cache.set(key, condensed)
+    return condensed
+
+
+def _allocate(sizes: list, available: int) -> list:
+    """Splits `available` tokens evenly; sections needing less than their share give the rest away."""
+    allocations = [0] * len(sizes)
+    pending = [i for i, size in enumerate(sizes) if size]
+    while pending:
+        share = available // len(pending)
+        small = [i for i in pending if sizes[i] <= share]
+        if not small:
+            for i in pending:
+                allocations[i] = max(share, MIN_SECTION_TOKENS)
+            break
+        for i in small:
+            allocations[i] = sizes[i]
+            available -= sizes[i]
+            pending.remove(i)
+    return allocations
+
+
+def fit_sections(fixed_prompt: str, sections: list, budget: int, model: str) -> list:
+    """
+    The free-text sections of a prompt, condensed where needed so that
+    fixed_prompt plus sections stays within budget. Records the prompt
+    size before and after in prompt_tokens{model,stage}.
+    """
+    fixed_tokens = count_tokens(fixed_prompt, model)
+    sizes = [count_tokens(section, model) if section else 0 for section in sections]
+    before = fixed_tokens + sum(sizes)
+
+    available = budget - fixed_tokens
+    if sum(sizes) <= available:
+        fitted = list(sections)
+        after = before
+    else:
+        allocations = _allocate(sizes, max(available, 0))
+        fitted = [
+            condense_text(section, allocation, model) if size > allocation else section
+            for section, size, allocation in zip(sections, sizes, allocations)
+        ]
+        after = fixed_tokens + sum(count_tokens(section, model) if section else 0 for section in fitted)
+        logger.debug("Prompt condensed from %d to %d tokens (budget %d, %s)", before, after, budget, model)
+
+    PROMPT_TOKENS.labels(model, "original").observe(before)
+    PROMPT_TOKENS.labels(model, "sent").observe(after)
+    return fitted
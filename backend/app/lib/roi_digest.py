@@ -0,0 +1,251 @@
+"""
+Weekly "your meeting ROI" digest for every user with analyzed meetings.
+
+Users are streamed from a server-side cursor in chunks (keyset order on
+users.id). Each chunk's recent predictions come from one extra query, the
+HTML is rendered by a process pool, and messages go out over a few pooled
+SMTP connections. Rendering and fetching of the next chunk overlap with
+sending the current one.
+
+After a chunk has been fully handed to the SMTP server its last user id is
+written to the checkpoint file, so a crashed run resumes after it (users of
+the chunk that was in flight may get the digest twice). The checkpoint is
+removed when a run completes.
+
+    cd backend
+    python -m app.lib.roi_digest --chunk-size 500 --workers 4 --connections 4
+"""
+import argparse
+import asyncio
+import html
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from typing import Iterator, Optional
+from uuid import UUID
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.logging_config import setup_logging, shutdown_logging
+from app.db.database import SessionLocal
+from app.db.models import Meeting, MeetingOverview, MeetingPrediction, User
+from app.lib.generate_email_html import _generate_email_html
+from app.lib.mail_transport import mail_transport_from_settings
+
+DIGEST_SUBJECT = "Your weekly MeetingROI digest"
+
+logger = logging.getLogger(__name__)
+
+
+# --- reading -------------------------------------------------------------
+
+def iter_user_chunks(session: Session, after: Optional[str], chunk_size: int) -> Iterator[list]:
+    """Users with an overview row, in users.id order, chunk_size rows at a time from a server-side cursor."""
+    stmt = (
+        select(
+            User.id, User.email, User.full_name,
+            MeetingOverview.total_meeting_analyzed,
+            MeetingOverview.total_productive_meetings,
+            MeetingOverview.total_estimated_cost,
+            MeetingOverview.total_estimated_value_gain,
+            MeetingOverview.total_roi,
+        )
+        .join(MeetingOverview, MeetingOverview.user_id == User.id)
+        .where(MeetingOverview.total_meeting_analyzed > 0)
+        .order_by(User.id)
+    )
+    if after:
+        stmt = stmt.where(User.id > UUID(after))
+    # yield_per implies stream_results, i.e. a named (server-side) cursor
+    result = session.execute(stmt.execution_options(yield_per=chunk_size))
+    for partition in result.partitions():
+        yield [row._asdict() for row in partition]
+
+
+def load_recent_predictions(user_ids: list, since: datetime, per_user: int) -> dict:
+    """Latest per_user predictions since `since` for every user in the chunk, in one query."""
+    ranked = (
+        select(
+            MeetingPrediction.user_id,
+            Meeting.meeting_title,
+            MeetingPrediction.predicted_at,
+            MeetingPrediction.is_productive,
+            MeetingPrediction.roi,
+            func.row_number().over(
+                partition_by=MeetingPrediction.user_id,
+                order_by=(MeetingPrediction.predicted_at.desc(), MeetingPrediction.id.desc()),
+            ).label("rn"),
+        )
+        .join(Meeting, Meeting.meeting_id == MeetingPrediction.meeting_id)
+        .where(MeetingPrediction.user_id.in_(user_ids), MeetingPrediction.predicted_at >= since)
+        .subquery()
+    )
+    recent = {}
+    with SessionLocal() as session:
+        for row in session.execute(select(ranked).where(ranked.c.rn <= per_user).order_by(ranked.c.user_id, ranked.c.rn)):
+            recent.setdefault(row.user_id, []).append({
+                "meeting_title": row.meeting_title,
+                "predicted_at": row.predicted_at.strftime("%b %d") if row.predicted_at else "",
+                "is_productive": row.is_productive,
+                "roi": row.roi,
+            })
+    return recent
+
+
+# --- rendering (runs in worker processes) --------------------------------
+
+def render_digest(payload: dict) -> tuple:
+    """(email, html) for one user. Only plain values in and out, so it pickles cheaply."""
+    analyzed = int(payload["total_meeting_analyzed"] or 0)
+    productive = int(payload["total_productive_meetings"] or 0)
+    average_roi = (payload["total_roi"] or 0) / analyzed if analyzed else 0.0
+    rows = "".join(
+        f"<li>{item['predicted_at']} &middot; {html.escape(item['meeting_title'] or '')} &middot; "
+        f"{'productive' if item['is_productive'] else 'needs work'} &middot; ROI {item['roi'] or 0:.2f}</li>"
+        for item in payload["recent"]
+    ) or "<li>No meetings analyzed this week.</li>"
+
+    intro_text = (
+        f"Hi {html.escape(payload['full_name'] or 'there')}, here is how your meetings are doing.<br><br>"
+        f"<strong>{analyzed}</strong> meetings analyzed, <strong>{productive}</strong> productive.<br>"
+        f"Estimated cost: <strong>${payload['total_estimated_cost'] or 0:,.2f}</strong> &middot; "
+        f"value gained: <strong>${payload['total_estimated_value_gain'] or 0:,.2f}</strong> &middot; "
+        f"average ROI: <strong>{average_roi:.2f}</strong><br><br>"
+        f"This week:<ul>{rows}</ul>"
+    )
+    body = _generate_email_html(
+        subject=DIGEST_SUBJECT,
+        preheader_text=f"{productive} of {analyzed} meetings were productive.",
+        intro_text=intro_text,
+        button_text="Open My Dashboard",
+        action_link=f"{settings.FRONTEND_URL}/dashboard",
+        closing_text="You are receiving this weekly summary because you use MeetingROI.",
+    )
+    return payload["email"], body
+
+
+def build_message(to_email: str, body: str) -> EmailMessage:
+    msg = EmailMessage()
+    msg["Subject"] = DIGEST_SUBJECT
+    msg["From"] = settings.MAIL_FROM
+    msg["To"] = to_email
+    msg.add_alternative(body, subtype="html")
+    return msg
+
+
+# --- checkpoint ----------------------------------------------------------
+
+def read_checkpoint(path: str) -> Optional[str]:
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f).get("last_user_id")
+
+
+def write_checkpoint(path: str, last_user_id: str, sent: int):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"last_user_id": last_user_id, "sent": sent, "at": datetime.utcnow().isoformat()}, f)
+    os.replace(tmp_path, path)
+
+
+# --- pipeline ------------------------------------------------------------
+
+async def run_digest(chunk_size: int = 500, workers: int = 4, connections: int = 4,
+                     days: int = 7, recent_per_user: int = 5,
+                     checkpoint_path: str = "roi_digest.checkpoint", restart: bool = False) -> dict:
+    loop = asyncio.get_running_loop()
+    after = None if restart else read_checkpoint(checkpoint_path)
+    if after:
+        logger.info("Resuming digest after user %s", after)
+    since = datetime.utcnow() - timedelta(days=days)
+
+    transport = mail_transport_from_settings(pool_size=connections, queue_size=chunk_size * 2)
+    await transport.start()
+    started = time.perf_counter()
+    queued = 0
+    in_flight_last_id = None
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool, SessionLocal() as session:
+            chunks = iter_user_chunks(session, after, chunk_size)
+            while True:
+                # Fetch and render the next chunk while the previous one is still sending
+                users = await asyncio.to_thread(next, chunks, None)
+                if users is None:
+                    break
+                recent = await asyncio.to_thread(
+                    load_recent_predictions, [user["id"] for user in users], since, recent_per_user
+                )
+                payloads = [
+                    {**user, "id": str(user["id"]), "recent": recent.get(user["id"], [])}
+                    for user in users
+                ]
+                rendered = await loop.run_in_executor(
+                    None, lambda: list(pool.map(render_digest, payloads, chunksize=max(1, len(payloads) // (workers * 4))))
+                )
+
+                if in_flight_last_id is not None:
+                    await transport.join()
+                    write_checkpoint(checkpoint_path, in_flight_last_id, transport.sent)
+
+                for to_email, body in rendered:
+                    await transport.enqueue(build_message(to_email, body))
+                queued += len(rendered)
+                in_flight_last_id = payloads[-1]["id"]
+
+                elapsed = time.perf_counter() - started
+                logger.info("%d queued, %d sent, %.1f msg/s", queued, transport.sent, transport.sent / elapsed)
+
+        await transport.join()
+    finally:
+        await transport.stop()
+        # stop() drains the queue; if everything queued was handled, the
+        # in-flight chunk is done even when the run is failing
+        if in_flight_last_id is not None and transport.sent + transport.failed == queued:
+            write_checkpoint(checkpoint_path, in_flight_last_id, transport.sent)
+
+    elapsed = time.perf_counter() - started
+    # Completed: the next run starts from the beginning again
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    report = {
+        "queued": queued,
+        "sent": transport.sent,
+        "failed": transport.failed,
+        "retries": transport.retries,
+        "connections_opened": transport.connections_opened,
+        "seconds": round(elapsed, 2),
+        "messages_per_second": round(transport.sent / elapsed, 1) if elapsed else 0.0,
+    }
+    logger.info("Digest done: %s", report)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunk-size", type=int, default=500, help="users per server-side cursor fetch")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2, help="HTML rendering processes")
+    parser.add_argument("--connections", type=int, default=4, help="SMTP connections kept open")
+    parser.add_argument("--days", type=int, default=7, help="how far back 'this week' reaches")
+    parser.add_argument("--recent", type=int, default=5, help="recent meetings listed per user")
+    parser.add_argument("--checkpoint", default="roi_digest.checkpoint")
+    parser.add_argument("--restart", action="store_true", help="ignore an existing checkpoint")
+    args = parser.parse_args()
+    setup_logging()
+    try:
+        asyncio.run(run_digest(
+            chunk_size=args.chunk_size,
+            workers=args.workers,
+            connections=args.connections,
+            days=args.days,
+            recent_per_user=args.recent,
+            checkpoint_path=args.checkpoint,
+            restart=args.restart,
+        ))
+    finally:
+        shutdown_logging()
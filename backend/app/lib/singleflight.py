@@ -0,0 +1,52 @@
+import asyncio
+import hashlib
+from typing import Awaitable, Callable, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+def prompt_key(model: str, prompt: str) -> str:
+    return f"{model}:{hashlib.sha256(prompt.encode('utf-8')).hexdigest()}"
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key into one execution.
+
+    The first caller for a key starts `fn()` as its own task; callers that
+    arrive while it runs await the same task and get the same result (or
+    exception). Each caller waits through asyncio.shield, so a cancelled
+    caller (e.g. a client disconnect) stops waiting without cancelling the
+    call for the others. The key is forgotten as soon as the call finishes:
+    this only merges requests that overlap in time, it is not a cache.
+    """
+
+    def __init__(self):
+        self._calls: dict = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.create_task(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._finished(key, done))
+            self.calls += 1
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _finished(self, key: Hashable, task: asyncio.Task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Mark the exception retrieved even if every caller was cancelled
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._calls),
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+        }
@@ -0,0 +1,82 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+from app.core.metrics import CACHE_LOOKUPS
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Size-bounded LRU cache whose entries also expire after `ttl` seconds.
+    Keeps hit/miss/eviction counters so callers can report hit rates; a
+    named cache also exports them as cache_lookups_total{cache=name}.
+    Safe to share between the event loop and threadpool routes.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, name: Optional[str] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._hit_counter = CACHE_LOOKUPS.labels(name, "hit") if name else None
+        self._miss_counter = CACHE_LOOKUPS.labels(name, "miss") if name else None
+        self._data: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                return self._miss(default)
+            expires_at, value = entry
+            if expires_at <= now:
+                del self._data[key]
+                return self._miss(default)
+            self._data.move_to_end(key)
+            self.hits += 1
+        if self._hit_counter is not None:
+            self._hit_counter.inc()
+        return value
+
+    def _miss(self, default: Any) -> Any:
+        self.misses += 1
+        if self._miss_counter is not None:
+            self._miss_counter.inc()
+        return default
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.pop(key, _MISSING)
+        return default if entry is _MISSING else entry[1]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
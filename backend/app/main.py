@@ -1,18 +1,67 @@
 from fastapi import FastAPI, HTTPException
 from app.core.config import settings
+from app.core.logging_config import setup_logging, shutdown_logging, RequestIdMiddleware
+from app.core.metrics import MetricsMiddleware
 
 from app.auth import routes as auth_routes
 from app.api.routes import predict as api_routes
-from app.api.routes.paddle_webhook import paddle_router
-from app.api.routes.predict import router
+from app.api.routes.paddle_webhook import paddle_router, paddle_event_worker
+from app.api.routes.predict import router, PREDICTION_MODELS
+from app.api.routes.internal import internal_router, metrics_router
+from app.lib.openai_client import init_openai_client, close_openai_client
+from app.lib.prediction_cache import prediction_cache
+from app.lib.prompt_budget import warm_encodings
+from app.ml.inference import get_inference_engine
+from app.db.write_behind import prediction_writer
+from app.db.plan_catalog import plan_catalog
+from app.lib.mail_transport import mail_transport
 from fastapi.middleware.cors import CORSMiddleware
+from contextlib import asynccontextmanager
+import asyncio
+import logging
 import uvicorn
 
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Log records are written by a background thread, never on the event loop
+    setup_logging()
+    # Long-lived, pooled HTTP client shared by every OpenAI call
+    await init_openai_client()
+    # Prompt budgets count tokens with tiktoken, whose BPE file downloads on first use
+    await warm_encodings(PREDICTION_MODELS)
+    # Load the scikit-learn artifacts up front when free traffic is served locally
+    if settings.FREE_PLAN_PREDICTION_BACKEND == "local":
+        try:
+            await asyncio.to_thread(get_inference_engine)
+        except FileNotFoundError as e:
+            logger.warning("Local prediction model not loaded: %s", e)
+    # Plans are read on every prediction and webhook; keep them in memory.
+    # Without them no request can be served, so a failed load fails startup
+    await plan_catalog.start()
+    await prediction_writer.start()
+    await mail_transport.start()
+    await paddle_event_worker.start()
+    try:
+        yield
+    finally:
+        await paddle_event_worker.stop()
+        await mail_transport.stop()
+        await prediction_writer.stop()
+        await plan_catalog.stop()
+        await close_openai_client()
+        if prediction_cache:
+            prediction_cache.close()
+        shutdown_logging()
+
 
 app = FastAPI(
     title="MeetingROI API",
     description="Predict if a meeting is productive and estimate cost",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 origins = settings.FRONTEND_URL
 app.add_middleware(
@@ -21,10 +70,15 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID"],
 )
+app.add_middleware(RequestIdMiddleware)
+app.add_middleware(MetricsMiddleware)
 app.include_router(auth_routes.router, prefix="/auth", tags=["Authentication"])
 app.include_router(router, prefix="/api", tags=["Meeting ROI"])
 app.include_router(paddle_router, prefix="/webhook", tags=["Paddle Webhook Ingtegration"])
+app.include_router(internal_router, prefix="/internal", tags=["Internal"], include_in_schema=False)
+app.include_router(metrics_router, include_in_schema=False)
 
 @app.get("/")
 def root():
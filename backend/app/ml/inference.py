@@ -0,0 +1,136 @@
+import os
+import threading
+import warnings
+import joblib
+import numpy as np
+from typing import Optional
+from app.core.config import settings
+from app.schemas.meeting_schemas import MeetingInput
+
+CATEGORICAL_COLUMNS = ["time_block", "tool", "meeting_type"]
+BOOLEAN_COLUMNS = ["remote", "has_action_items"]
+
+
+class MeetingInferenceEngine:
+    """
+    Loads the artifacts written by app/ml/train.py once and scores a single
+    MeetingInput in-process, mirroring the preprocessing used for training.
+    The models predict productivity and cost only, so roi and
+    estimated_value_gain_on_meeting are left empty (None).
+    """
+
+    def __init__(self, model_dir: str):
+        self.productivity_model = joblib.load(os.path.join(model_dir, "productivity_model.pkl"))
+        self.cost_model = joblib.load(os.path.join(model_dir, "estimated_cost_model.pkl"))
+        self.label_encoder = joblib.load(os.path.join(model_dir, "label_encoder.pkl"))
+        self.features = list(joblib.load(os.path.join(model_dir, "model_features.pkl")))
+
+        # Single-row predictions are faster without joblib's worker fan-out
+        for model in (self.productivity_model, self.cost_model):
+            if hasattr(model, "n_jobs"):
+                model.n_jobs = 1
+
+        # Precompute where every input lands in the feature vector
+        self._numeric_index = {}
+        self._role_index = {}
+        self._categorical_index = {}
+        for idx, name in enumerate(self.features):
+            if name.startswith("role_"):
+                self._role_index[name[len("role_"):]] = idx
+                continue
+            for column in CATEGORICAL_COLUMNS:
+                prefix = f"{column}_"
+                if name.startswith(prefix):
+                    self._categorical_index[(column, name[len(prefix):])] = idx
+                    break
+            else:
+                self._numeric_index[name] = idx
+
+        # A feature MeetingInput cannot fill would silently score as 0
+        unknown = [name for name in self._numeric_index if name not in MeetingInput.model_fields]
+        if unknown:
+            raise ValueError(f"Model features not provided by MeetingInput: {', '.join(unknown)}")
+
+        classes = [str(c).lower() for c in self.label_encoder.classes_]
+        self._productive_class = classes.index("productive") if "productive" in classes else len(classes) - 1
+
+    def build_features(self, meeting: MeetingInput) -> np.ndarray:
+        row = np.zeros((1, len(self.features)), dtype=np.float64)
+
+        for name, idx in self._numeric_index.items():
+            value = getattr(meeting, name)
+            if name in BOOLEAN_COLUMNS:
+                value = int(bool(value))
+            row[0, idx] = float(value or 0)
+
+        for role in meeting.roles.split(";"):
+            idx = self._role_index.get(role.strip())
+            if idx is not None:
+                row[0, idx] = 1.0
+
+        # drop_first=True means the baseline category has no column at all
+        for column in CATEGORICAL_COLUMNS:
+            idx = self._categorical_index.get((column, getattr(meeting, column)))
+            if idx is not None:
+                row[0, idx] = 1.0
+
+        return row
+
+    def predict(self, meeting: MeetingInput) -> dict:
+        row = self.build_features(meeting)
+
+        # train.py fits on a DataFrame; we score plain arrays in the same column order
+        with warnings.catch_warnings():
+            warnings.filterwarnings("ignore", message="X does not have valid feature names")
+            probabilities = self.productivity_model.predict_proba(row)[0]
+            estimated_cost = round(float(self.cost_model.predict(row)[0]), 2)
+        predicted = int(np.argmax(probabilities))
+
+        return {
+            "is_productive": predicted == self._productive_class,
+            "confidence_score": int(round(float(probabilities[predicted]) * 100)),
+            "roi": None,
+            "estimated_cost": estimated_cost,
+            "estimated_value_gain_on_meeting": None,
+            "suggestions": suggest_improvements(meeting),
+        }
+
+
+def suggest_improvements(meeting: MeetingInput) -> dict:
+    """
+    Rule-based suggestions, in the same shape the GPT backend returns.
+    """
+    agenda_suggestions = []
+    general_suggestions = []
+    if not meeting.agenda_file:
+        agenda_suggestions.append("Share a written agenda with attendees before the meeting.")
+    if meeting.agenda_clarity <= 2:
+        agenda_suggestions.append("Clarify the agenda with concrete goals for each item.")
+    if not meeting.has_action_items:
+        general_suggestions.append("End the meeting with clear, assigned action items.")
+    if meeting.duration > 60:
+        general_suggestions.append("Reduce the meeting duration or split it into focused sessions.")
+    if meeting.attendees > 10:
+        general_suggestions.append("Limit attendees to key stakeholders.")
+    return {
+        "agenda_suggestions": agenda_suggestions,
+        "general_suggestions": general_suggestions,
+    }
+
+
+_engine: Optional[MeetingInferenceEngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_inference_engine() -> MeetingInferenceEngine:
+    """
+    Returns the process-wide engine, loading the .pkl artifacts on first use.
+    Raises FileNotFoundError when the models have not been trained yet and
+    ValueError when their features do not match MeetingInput.
+    """
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = MeetingInferenceEngine(settings.ML_MODEL_DIR)
+    return _engine
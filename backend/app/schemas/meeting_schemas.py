@@ -3,6 +3,23 @@ from typing import List, Optional
 from datetime import datetime
 from uuid import UUID
 
+class MeetingInput(BaseModel):
+    time_block: str
+    meeting_title: str
+    meeting_notes: str
+    remote: bool
+    tool: str
+    agenda_file: Optional[str] = None
+    meeting_type: str
+    duration: int
+    attendees: int
+    agenda_clarity: int
+    has_action_items: bool
+    departments: int
+    roles: str
+    average_annual_salary: float
+
+
 class RecentPredictionOut(BaseModel):
     id: UUID
     meeting_title: str
@@ -12,6 +29,10 @@ class RecentPredictionOut(BaseModel):
 
     class Config:
         from_attributes = True
+class RecentPredictionPage(BaseModel):
+    items: List[RecentPredictionOut]
+    next_before: Optional[str] = None  # cursor for the next (older) page
+
 class UserUsage(BaseModel):
     predictions_used: int
     max_predictions_per_month: int
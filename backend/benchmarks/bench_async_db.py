@@ -0,0 +1,71 @@
+"""
+Concurrent-request throughput of DB work inside `async def` routes, with the
+old sync Session (blocking the event loop) versus the AsyncSession path.
+
+Each simulated request does the same work as get_current_user + a plan lookup,
+plus a server-side pg_sleep to stand in for a slow query.
+
+    cd backend
+    python -m benchmarks.bench_async_db --requests 500 --concurrency 50 --query-delay 0.01
+"""
+import argparse
+import asyncio
+import time
+from sqlalchemy import select, text
+from app.db.database import SessionLocal, AsyncSessionLocal, async_engine
+from app.db.models import User, Plan
+
+
+def sync_request(delay: float):
+    with SessionLocal() as db:
+        user = db.execute(select(User).limit(1)).scalars().first()
+        if user and user.plan_id:
+            db.get(Plan, user.plan_id)
+        db.execute(text("SELECT pg_sleep(:d)"), {"d": delay})
+
+
+async def blocking_request(delay: float):
+    # What the routes did before: sync Session calls straight on the loop
+    sync_request(delay)
+
+
+async def async_request(delay: float):
+    async with AsyncSessionLocal() as db:
+        user = (await db.execute(select(User).limit(1))).scalars().first()
+        if user and user.plan_id:
+            await db.get(Plan, user.plan_id)
+        await db.execute(text("SELECT pg_sleep(:d)"), {"d": delay})
+
+
+async def run(handler, requests: int, concurrency: int, delay: float) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            await handler(delay)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    return requests / (time.perf_counter() - started)
+
+
+async def main(args):
+    # Warm both pools so connection setup is not measured
+    await run(blocking_request, 5, 5, 0)
+    await run(async_request, args.concurrency, args.concurrency, 0)
+
+    before = await run(blocking_request, args.requests, args.concurrency, args.query_delay)
+    after = await run(async_request, args.requests, args.concurrency, args.query_delay)
+    print(f"requests={args.requests} concurrency={args.concurrency} query_delay={args.query_delay}s")
+    print(f"sync Session on event loop : {before:8.1f} req/s")
+    print(f"AsyncSession (asyncpg)     : {after:8.1f} req/s")
+    print(f"speedup                    : {after / before:8.1f}x")
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--query-delay", type=float, default=0.01)
+    asyncio.run(main(parser.parse_args()))
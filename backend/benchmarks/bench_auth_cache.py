@@ -0,0 +1,53 @@
+"""
+Per-request authentication overhead: get_current_user (JWT decode + users
+SELECT every time) versus get_current_user_snapshot (JWT decode + cached
+UserSnapshot). Uses the first user in the database unless --user-id is given.
+
+    cd backend
+    python -m benchmarks.bench_auth_cache --requests 2000
+"""
+import argparse
+import asyncio
+import time
+from sqlalchemy import select
+from app.auth.jwt import create_access_token, get_current_user, get_current_user_snapshot
+from app.auth.user_cache import user_snapshot_cache
+from app.db.database import AsyncSessionLocal, async_engine
+from app.db.models import User
+
+
+async def measure(dependency, token: str, requests: int) -> float:
+    started = time.perf_counter()
+    for _ in range(requests):
+        # A fresh session per request, as get_async_db provides
+        async with AsyncSessionLocal() as db:
+            await dependency(token=token, db=db)
+    return (time.perf_counter() - started) / requests * 1e6
+
+
+async def main(args):
+    async with AsyncSessionLocal() as db:
+        user_id = args.user_id or await db.scalar(select(User.id).limit(1))
+    if user_id is None:
+        raise SystemExit("No users in the database; pass --user-id")
+    token = create_access_token({"user_id": str(user_id)})
+
+    # Warm the pool and the cache
+    await measure(get_current_user, token, 10)
+    user_snapshot_cache.clear()
+    await measure(get_current_user_snapshot, token, 1)
+
+    without_cache = await measure(get_current_user, token, args.requests)
+    with_cache = await measure(get_current_user_snapshot, token, args.requests)
+    print(f"requests={args.requests} user={user_id}")
+    print(f"get_current_user (DB every request) : {without_cache:9.1f} µs/request")
+    print(f"get_current_user_snapshot (cached)  : {with_cache:9.1f} µs/request")
+    print(f"cache stats: {user_snapshot_cache.stats()}")
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--user-id")
+    asyncio.run(main(parser.parse_args()))
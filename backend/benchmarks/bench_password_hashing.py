@@ -0,0 +1,72 @@
+"""
+Login throughput at several bcrypt cost factors: verify_password called inline
+on the event loop versus verify_password_async on the bounded hashing pool.
+Also reports the worst event-loop stall seen while the logins were running,
+which is what other requests on the same worker experience.
+
+    cd backend
+    python -m benchmarks.bench_password_hashing --rounds 10 12 14 --logins 64
+"""
+import argparse
+import asyncio
+import time
+from passlib.context import CryptContext
+from app.auth import utils
+
+
+async def loop_stall(stop: asyncio.Event) -> float:
+    """Longest gap between 1 ms ticks while the benchmark is running."""
+    worst = 0.0
+    last = time.perf_counter()
+    while not stop.is_set():
+        await asyncio.sleep(0.001)
+        now = time.perf_counter()
+        worst = max(worst, now - last - 0.001)
+        last = now
+    return worst
+
+
+async def run_logins(login, logins: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            await login()
+
+    stop = asyncio.Event()
+    ticker = asyncio.create_task(loop_stall(stop))
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(logins)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    return logins / elapsed, await ticker
+
+
+async def main(args):
+    password = "correct horse battery staple"
+    print(f"logins={args.logins} concurrency={args.concurrency} workers={utils.settings.PASSWORD_HASH_WORKERS}")
+    for rounds in args.rounds:
+        # Swap the shared context so both paths use this cost factor
+        utils.pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=rounds)
+        hashed = utils.hash_password(password)
+
+        async def inline():
+            assert utils.verify_password(password, hashed)
+
+        async def pooled():
+            assert await utils.verify_password_async(password, hashed)
+
+        inline_rate, inline_stall = await run_logins(inline, args.logins, args.concurrency)
+        pooled_rate, pooled_stall = await run_logins(pooled, args.logins, args.concurrency)
+        print(
+            f"rounds={rounds:2d}  inline {inline_rate:8.1f} logins/s (max stall {inline_stall * 1000:8.1f} ms)"
+            f"  pooled {pooled_rate:8.1f} logins/s (max stall {pooled_stall * 1000:6.1f} ms)"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, nargs="+", default=[10, 12, 14])
+    parser.add_argument("--logins", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=32)
+    asyncio.run(main(parser.parse_args()))
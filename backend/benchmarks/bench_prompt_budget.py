@@ -0,0 +1,73 @@
+"""
+Prediction prompt size per plan budget for a meeting with a long agenda:
+tokens before and after condensation, and the time to build the prompt
+the first time versus for a recurring (cached) agenda. No database or
+OpenAI access is needed.
+
+    cd backend
+    python -m benchmarks.bench_prompt_budget --sections 40 --builds 200
+"""
+import argparse
+import time
+from app.api.routes.predict import build_prediction_prompt
+from app.lib.prompt_budget import condensed_cache, count_tokens, load_encoding, plan_token_budget, tokenizer_name
+from app.schemas.meeting_schemas import MeetingInput
+
+BOILERPLATE = "Please join five minutes early and keep your camera on."
+
+
+def long_agenda(sections: int) -> str:
+    parts = []
+    for i in range(sections):
+        parts.append(f"## {i + 1}. Workstream {i + 1} review")
+        parts.append(
+            f"The team will walk through the status of workstream {i + 1}. We expect a short update "
+            "from every owner, followed by an open discussion of blockers, dependencies and the "
+            "decisions that need to be taken before the next checkpoint. Background material was "
+            "shared last week and is assumed to have been read."
+        )
+        parts.extend(f"- Owner update {j + 1}: progress, risks and next steps for item {i + 1}.{j + 1}" for j in range(4))
+        parts.append(BOILERPLATE)
+    return "\n".join(parts)
+
+
+def meeting(sections: int) -> MeetingInput:
+    return MeetingInput(
+        time_block="morning", meeting_title="Quarterly planning", meeting_notes="Quarterly planning across all workstreams.",
+        agenda_file=long_agenda(sections), remote=True, tool="Zoom", meeting_type="planning", duration=90,
+        attendees=12, agenda_clarity=3, has_action_items=True, departments=4, roles="Engineer;PM;Designer",
+        average_annual_salary=110000,
+    )
+
+
+def measure(meeting_data: MeetingInput, budget, model: str, builds: int) -> float:
+    started = time.perf_counter()
+    for _ in range(builds):
+        build_prediction_prompt(meeting_data, budget, model)
+    return (time.perf_counter() - started) / builds * 1e3
+
+
+def main(args):
+    meeting_data = meeting(args.sections)
+    model = "gpt-5-nano"
+    load_encoding(model)
+    original = count_tokens(build_prediction_prompt(meeting_data), model)
+    print(f"sections={args.sections} tokenizer={tokenizer_name(model)} original prompt={original} tokens")
+    for plan in ("free", "pro", "business"):
+        budget = plan_token_budget(plan)
+        condensed_cache.clear()
+        cold = measure(meeting_data, budget, model, 1)
+        warm = measure(meeting_data, budget, model, args.builds)
+        sent = count_tokens(build_prediction_prompt(meeting_data, budget, model), model)
+        print(f"{plan:9s} budget={budget:6d}  sent={sent:6d} tokens ({sent / original:6.1%})  "
+              f"build first={cold:7.2f} ms  recurring={warm:6.2f} ms")
+    if args.show:
+        print(build_prediction_prompt(meeting_data, plan_token_budget("free"), model))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sections", type=int, default=40, help="agenda sections (each ~120 tokens)")
+    parser.add_argument("--builds", type=int, default=200)
+    parser.add_argument("--show", action="store_true", help="print the prompt sent on the free plan")
+    main(parser.parse_args())
@@ -0,0 +1,92 @@
+"""
+Throughput of the subscription webhook apply path (handle_paddle_event, as
+run by the background worker): synthetic subscription.* events for a set of
+throwaway users are replayed one at a time, each in its own session.
+Reports events/s, per-event latency and SQL statements per event. The
+users and subscriptions it creates are deleted afterwards.
+
+    cd backend
+    python -m benchmarks.bench_subscription_webhook --events 3000 --users 200
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+import uuid
+from sqlalchemy import delete, event, insert
+from app.api.routes.paddle_webhook import handle_paddle_event
+from app.db.database import AsyncSessionLocal, async_engine
+from app.db.models import Subscription, User
+from app.db.plan_catalog import plan_catalog
+
+EVENT_TYPES = ["subscription.created", "subscription.updated", "subscription.activated",
+               "subscription.past_due", "subscription.resumed"]
+
+
+def synthetic_event(user_id: str, subscription_id: str, price_cents: int) -> dict:
+    return {
+        "event_id": f"evt_{uuid.uuid4().hex}",
+        "event_type": random.choice(EVENT_TYPES),
+        "occurred_at": "2026-01-01T00:00:00Z",
+        "data": {
+            "id": subscription_id,
+            "status": random.choice(["active", "past_due", "trialing"]),
+            "custom_data": {"user_id": user_id},
+            "items": [{"price": {"id": f"pri_bench_{price_cents}", "unit_price": {"amount": str(price_cents)}}, "quantity": 1}],
+            "current_billing_period": {"starts_at": "2026-01-01T00:00:00Z", "ends_at": "2026-02-01T00:00:00Z"},
+            "next_billed_at": "2026-02-01T00:00:00Z",
+        },
+    }
+
+
+async def main(args):
+    await plan_catalog.reload()
+    prices = [int(plan.price_usd * 100) for plan in plan_catalog.all()] or [2900]
+    user_ids = [str(uuid.uuid4()) for _ in range(args.users)]
+    async with AsyncSessionLocal() as db:
+        await db.execute(insert(User), [
+            {"id": user_id, "email": f"bench-{user_id}@example.invalid", "password_hash": "x", "plan_status": "free"}
+            for user_id in user_ids
+        ])
+        await db.commit()
+    subscriptions = {user_id: f"sub_bench_{uuid.uuid4().hex[:12]}" for user_id in user_ids}
+
+    statements = 0
+
+    def count_statement(*_):
+        nonlocal statements
+        statements += 1
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", count_statement)
+    latencies = []
+    try:
+        started = time.perf_counter()
+        for _ in range(args.events):
+            user_id = random.choice(user_ids)
+            payload = synthetic_event(user_id, subscriptions[user_id], random.choice(prices))
+            t0 = time.perf_counter()
+            async with AsyncSessionLocal() as db:
+                await handle_paddle_event(db, payload)
+            latencies.append(time.perf_counter() - t0)
+        elapsed = time.perf_counter() - started
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", count_statement)
+        async with AsyncSessionLocal() as db:
+            await db.execute(delete(Subscription).where(Subscription.user_id.in_(user_ids)))
+            await db.execute(delete(User).where(User.id.in_(user_ids)))
+            await db.commit()
+        await async_engine.dispose()
+
+    latencies.sort()
+    print(f"events={args.events} users={args.users} subscriptions={len(subscriptions)}")
+    print(f"throughput     : {args.events / elapsed:9.1f} events/s")
+    print(f"latency p50/p95: {statistics.median(latencies) * 1000:7.2f} / {latencies[int(len(latencies) * 0.95)] * 1000:7.2f} ms")
+    print(f"SQL statements : {statements / args.events:9.2f} per event")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=3000)
+    parser.add_argument("--users", type=int, default=200)
+    asyncio.run(main(parser.parse_args()))